@@ -1,25 +1,28 @@
+import time
+_import_start = time.perf_counter()
+
 import streamlit as st
 import os
 import re
-import pickle
-import PyPDF2  # Usando PyPDF2 conforme solicitado
-import requests  # Necessário para requisições (se houver necessidade em outras partes)
+import random
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
-from googlesearch import search  # Certifique-se de instalar com "pip install googlesearch-python"
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from metricas import record, span, trace
 
 # LangChain/IA
-from langchain_community.document_loaders import CSVLoader
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage
+# Os módulos pesados (FAISS, PyPDF2, busca na web, modelo de chat) são importados
+# somente quando o recurso correspondente é usado pela primeira vez
+from langchain_core.messages import AIMessage, HumanMessage
 
 # ------------------------ CONFIGURAÇÕES INICIAIS ------------------------
 load_dotenv()  # Carrega as variáveis definidas no .env
-st.set_page_config(
-    page_title="Assistente Virtual NavSupply",
-    layout="wide"
-)
 
 # ------------------------ CSS PERSONALIZADO ------------------------
 css = """
@@ -60,98 +63,384 @@ html, body, [class*="css"] {
 }
 </style>
 """
-st.markdown(css, unsafe_allow_html=True)
 
-# ------------------------ FUNÇÃO DE BUSCA NO GOOGLE ------------------------
-def google_search(query):
+# ------------------------ TEMPOS DE INICIALIZAÇÃO ------------------------
+@st.cache_resource(show_spinner=False)
+def get_startup_timings():
+    """Duração de cada fase da inicialização do servidor, em segundos."""
+    return {}
+
+def record_startup_phase(phase: str, seconds: float):
+    """Guarda a primeira medição de cada fase, exibida na barra lateral ("Tempos de inicialização")."""
+    timings = get_startup_timings()
+    if phase not in timings:
+        timings[phase] = seconds
+
+record_startup_phase("imports", time.perf_counter() - _import_start)
+
+# ------------------------ BUSCA NA WEB ------------------------
+@st.cache_resource
+def get_web_search():
     """
-    Realiza uma busca no Google e retorna os 3 primeiros resultados (URLs).
+    Busca na web usada quando o catálogo não traz contexto, com prazo máximo (WEB_SEARCH_BUDGET)
+    e cache dos resultados. O provedor é escolhido por WEB_SEARCH_PROVIDER (google, stub ou nenhum).
     """
-    results = []
-    try:
-        for url in search(query, tld="com", num=3, stop=3, pause=2):
-            results.append(url)
-    except Exception as e:
-        st.error(f"Erro ao buscar na web: {e}")
-    return results
+    from busca_web import WebSearch
 
-# ------------------------ FUNÇÕES COM CACHE ------------------------
-@st.cache_data
-def load_documents():
-    """Carrega os documentos do CSV uma única vez."""
-    loader = CSVLoader(file_path="merged_data.csv", encoding="utf-8")
-    documents = list(loader.lazy_load())
-    return documents
+    return WebSearch()
 
-@st.cache_resource
-def get_vectorstore():
+# ------------------------ CARREGAMENTO EM SEGUNDO PLANO ------------------------
+CATALOG_FILE = "merged_data.csv"
+
+def build_catalog_index(documents: list) -> dict:
     """
-    Cria e retorna o índice vetorial utilizando embeddings.
-    Se já existir um índice pré-computado em 'faiss_index.pkl', ele é carregado.
-    Caso contrário, é gerado e salvo para futuras execuções.
+    Monta um índice em memória (hash) do código IMPA para a linha do catálogo.
+    Permite localizar um produto pelo código em O(1), sem chamar o modelo de embeddings.
     """
-    index_file = "faiss_index.pkl"
-    # Verifica se o índice já foi salvo localmente
-    if os.path.exists(index_file):
-        try:
-            with open(index_file, "rb") as f:
-                vectorstore = pickle.load(f)
-            st.info("Índice vetorial carregado a partir do arquivo pré-computado.")
-            return vectorstore
-        except Exception as e:
-            st.error(f"Erro ao carregar o índice salvo: {e}")
-    
-    # Se não existir, cria o índice e o salva
-    documents = load_documents()  # Obtém os documentos internamente
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.from_documents(documents, embeddings)
-    
+    from catalogo import document_code
+
+    catalog_index = {}
+    for doc in documents:
+        code = document_code(doc)
+        if code and code not in catalog_index:
+            catalog_index[code] = doc.page_content
+    return catalog_index
+
+def open_vectorstore():
+    """
+    Cria e retorna o índice vetorial utilizando embeddings, junto com uma mensagem de status.
+    Se existir em 'faiss_index/' um índice gerado a partir do mesmo catálogo (mesmo hash)
+    e do mesmo modelo de embeddings, ele é carregado com mmap. Caso contrário, é atualizado
+    de forma incremental (ou gerado) e salvo para futuras execuções.
+    """
+    from cache_embeddings import create_embeddings
+    from indice_vetorial import INDEX_DIR, load_index, update_index
+
+    embeddings = create_embeddings()  # Embeddings com cache em disco (indexação e consultas)
+    start = time.perf_counter()
+    vectorstore = load_index(embeddings, CATALOG_FILE, INDEX_DIR)
+    if vectorstore is not None:
+        return vectorstore, f"Índice vetorial carregado a partir do disco em {time.perf_counter() - start:.2f}s."
+
+    # Se não existir (ou estiver desatualizado), atualiza o índice: só as linhas novas ou alteradas
+    # do catálogo geram embeddings
+    report = update_index(embeddings, CATALOG_FILE, INDEX_DIR)
+    vectorstore = load_index(embeddings, CATALOG_FILE, INDEX_DIR)
+    return vectorstore, (
+        f"Índice vetorial atualizado e salvo em {time.perf_counter() - start:.2f}s "
+        f"({report['adicionados']} adicionados, {report['alterados']} alterados, "
+        f"{report['removidos']} removidos, {report['embeddings_economizados']} embeddings reaproveitados)."
+    )
+
+def _warm_up(state: dict):
+    def phase(name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        record_startup_phase(name, time.perf_counter() - start)
+        record("inicializacao", time.perf_counter() - start, fase=name)
+        return result
+
     try:
-        with open(index_file, "wb") as f:
-            pickle.dump(vectorstore, f)
-        st.info("Índice vetorial criado e salvo com sucesso.")
+        from catalogo import load_catalog_documents
+        from busca_lexical import LexicalIndex
+
+        documents = phase("catalogo", load_catalog_documents, CATALOG_FILE)
+        state["documentos"] = documents
+        state["indice_codigos"] = phase("indice_codigos", build_catalog_index, documents)
+        state["indice_lexical"] = phase("indice_lexical", LexicalIndex, documents)
+        state["db"], state["mensagem"] = phase("indice_vetorial", open_vectorstore)
+        state["status"] = "pronto"
     except Exception as e:
-        st.error(f"Erro ao salvar o índice: {e}")
-    return vectorstore
+        state["status"] = "erro"
+        state["mensagem"] = f"Erro ao carregar o índice: {e}"
+    finally:
+        state["pronto"].set()
+
+@st.cache_resource
+def get_warmup():
+    """
+    Inicia, uma única vez por servidor, o carregamento do catálogo e dos índices (códigos,
+    lexical e vetorial) em uma thread de segundo plano, para que a interface apareça sem esperar.
+    """
+    state = {"status": "carregando", "mensagem": "", "pronto": threading.Event()}
+    threading.Thread(target=_warm_up, args=(state,), name="warmup-indices", daemon=True).start()
+    return state
+
+def discard_failed_warmup(state: dict):
+    """
+    Tira do cache um carregamento que terminou em erro (API fora do ar, índice bloqueado...),
+    para que a próxima execução da página tente de novo em vez de repetir o erro até reiniciar o servidor.
+    """
+    if state["status"] == "erro" and get_warmup() is state:  # Outra sessão pode já ter reiniciado
+        get_warmup.clear()
+
+def wait_warmup() -> dict:
+    """Aguarda o fim do carregamento em segundo plano e retorna o seu estado."""
+    state = get_warmup()
+    state["pronto"].wait()
+    if state["status"] == "erro":
+        discard_failed_warmup(state)
+        raise RuntimeError(state["mensagem"])
+    return state
+
+def load_documents():
+    """Documentos do catálogo (versão compilada em Arrow, lida via mmap)."""
+    return wait_warmup()["documentos"]
 
-# Carregar o índice vetorial (aproveitando o cache)
-db = get_vectorstore()
+def load_catalog_index():
+    """Índice do código IMPA para a linha do catálogo."""
+    return wait_warmup()["indice_codigos"]
+
+def get_vectorstore():
+    """Índice vetorial do catálogo."""
+    return wait_warmup()["db"]
+
+def get_lexical_index():
+    """Índice lexical (BM25) do catálogo."""
+    return wait_warmup()["indice_lexical"]
+
+@st.cache_resource
+def get_answer_cache():
+    """Cache de respostas do chat, compartilhado entre todas as sessões."""
+    from cache_respostas import AnswerCache
+
+    return AnswerCache(get_vectorstore().embedding_function)
 
 def retrieve_info(query):
-    similar_response = db.similarity_search(query, k=3)
+    from busca_lexical import hybrid_search
+
+    # Busca híbrida: lexical (local) + vetorial, combinadas; a vetorial é dispensada
+    # quando a lexical já responde com segurança
+    with span("retrieve_info") as attrs:
+        similar_response = hybrid_search(get_lexical_index(), get_vectorstore(), query, k=3)
+        attrs["resultados"] = len(similar_response)
     return [doc.page_content for doc in similar_response]
 
 # ------------------------ FUNÇÕES PARA PROCESSAR PDF ------------------------
 def process_pdf(file) -> list:
     """
-    Lê um arquivo PDF, extrai o texto e procura por códigos IMPA (6 dígitos).
-    Para cada código encontrado, tenta capturar a linha onde ele aparece (como contexto).
+    Lê um arquivo PDF página a página e procura por códigos IMPA (6 dígitos) em uma única passada.
+    Para cada código encontrado, captura a linha onde ele aparece (como contexto).
     Retorna uma lista de tuplas: (codigo, contexto).
     """
+    from pdf_extrator import extract_codes, iter_pages
+
     try:
-        pdf_reader = PyPDF2.PdfReader(file)
+        with span("pdf_extracao", arquivo=file.name) as attrs:
+            codes = extract_codes(iter_pages(file))
+            attrs["codigos"] = len(codes)
+            return codes
     except Exception as e:
         st.error(f"Erro ao ler o PDF {file.name}: {e}")
         return []
-    
-    full_text = ""
-    for page in pdf_reader.pages:
-        text = page.extract_text()
-        if text:
-            full_text += text + "\n"
-    
-    pattern = re.compile(r'(\d{6})')  # Busca sequências de 6 dígitos
-    matches = pattern.findall(full_text)
-    unique_codes = list(set(matches))
-    
-    results = []
-    lines = full_text.splitlines()
-    for code in unique_codes:
-        for line in lines:
-            if code in line:
-                results.append((code, line.strip()))
-                break
-    return results
+
+@st.cache_resource
+def get_pdf_pool():
+    """Pool de processos, reaproveitado entre execuções, para extrair vários PDFs em paralelo."""
+    from pdf_extrator import create_pool
+
+    return create_pool()
+
+# Unidades de medida comuns em cotações (ex.: "HAIR BRUSH BRISTLE - PC")
+UNIT_TOKENS = {
+    "PC", "PCS", "PCE", "EA", "UN", "UND", "UNID", "PR", "PAIR", "SET", "KIT", "BOX", "CX",
+    "PKT", "PAC", "PACK", "BTL", "CAN", "TIN", "TUBE", "ROLL", "RL", "MTR", "M", "MM", "CM",
+    "KG", "KGS", "G", "LTR", "L", "ML", "DZ", "DOZ", "SHT", "COIL", "DRUM",
+}
+# Palavras que indicam que o número de 6 dígitos não é um código IMPA
+NOISE_TOKENS = {
+    "TEL", "FONE", "PHONE", "FAX", "CEP", "ZIP", "DATE", "DATA", "PO", "ORDER", "PEDIDO",
+    "INVOICE", "NF", "CNPJ", "CPF", "VAT", "REF", "RFQ", "QUOTATION", "COTACAO", "PAGE", "PAGINA",
+}
+ACCEPT_SCORE = 4  # Pontuação a partir da qual o candidato é aceito sem consultar o modelo
+REJECT_SCORE = 0  # Pontuação igual ou abaixo da qual o candidato é descartado sem consultar o modelo
+
+def score_candidate(code: str, context: str, known_codes) -> int:
+    """
+    Pontua um candidato a código IMPA a partir do catálogo e das palavras ao redor do código.
+    Códigos conhecidos, unidades de medida, quantidades e descrições somam pontos;
+    palavras de telefone, data, pedido etc. subtraem.
+    """
+    tokens = re.findall(r"[A-Za-zÀ-ÿ]+|\d+(?:[.,]\d+)?", context.replace(code, " "))
+    words = [t.upper() for t in tokens if t[0].isalpha()]
+    numbers = [t for t in tokens if t[0].isdigit()]
+
+    score = 0
+    if code in known_codes:
+        score += 3
+    if any(word in UNIT_TOKENS for word in words):
+        score += 1
+    if any(len(number) <= 4 for number in numbers):  # Coluna de quantidade
+        score += 1
+    if len([word for word in words if len(word) > 2]) >= 2:  # Há uma descrição em texto
+        score += 1
+    if any(word in NOISE_TOKENS for word in words):
+        score -= 2
+    return score
+
+def filter_candidates(candidates: list, known_codes) -> tuple:
+    """
+    Filtra os candidatos (codigo, contexto) antes de qualquer chamada ao modelo.
+    Retorna (aceitos, ambiguos, estatisticas): os aceitos dispensam a validação pelo modelo,
+    os ambíguos ainda precisam dela e as estatísticas contam os descartes de cada etapa.
+    """
+    stats = {
+        "candidatos": len(candidates),
+        "descartados_formato": 0,
+        "descartados_pontuacao": 0,
+        "aceitos_sem_llm": 0,
+        "enviados_llm": 0,
+    }
+    accepted, ambiguous = [], []
+    for code, context in candidates:
+        # Etapa 1: o código precisa ser um número isolado (não parte de telefone, data, CNPJ...)
+        if not re.search(rf"(?<![\d/.\-]){code}(?![\d/\-]|\.\d)", context):
+            stats["descartados_formato"] += 1
+            continue
+        # Etapa 2: pontuação pelo catálogo e pelo contexto
+        score = score_candidate(code, context, known_codes)
+        if score <= REJECT_SCORE:
+            stats["descartados_pontuacao"] += 1
+        elif score >= ACCEPT_SCORE:
+            stats["aceitos_sem_llm"] += 1
+            accepted.append((code, context))
+        else:
+            stats["enviados_llm"] += 1
+            ambiguous.append((code, context))
+    return accepted, ambiguous, stats
+
+# ------------------------ CHAMADAS AO MODELO ------------------------
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))  # Chamadas simultâneas ao modelo de chat
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))  # Tentativas quando a API responde 429
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", 1500))  # Tokens de contexto por requisição em lote
+LLM_BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", 40))  # Máximo de trechos por requisição em lote
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa simples de tokens (cerca de 4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+@st.cache_resource
+def get_usage_counter():
+    """Contador de requisições e tokens enviados ao modelo, compartilhado entre execuções e threads."""
+    return {"requisicoes": 0, "tokens_prompt": 0, "tokens_resposta": 0}, threading.Lock()
+
+# Uso da execução em andamento (ver track_usage); cada sessão do Streamlit tem o seu
+_run_usage = contextvars.ContextVar("uso_execucao", default=None)
+
+@contextmanager
+def track_usage():
+    """
+    Soma as requisições e os tokens das chamadas ao modelo feitas dentro do bloco, sem misturar
+    as de outras sessões (inclusive as feitas nas threads de identify_items).
+    """
+    usage = {"requisicoes": 0, "tokens_prompt": 0, "tokens_resposta": 0}
+    token = _run_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _run_usage.reset(token)
+
+def _record_usage(messages, response):
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    prompt_tokens = token_usage.get("prompt_tokens") or sum(estimate_tokens(m.content) for m in messages)
+    completion_tokens = token_usage.get("completion_tokens") or estimate_tokens(response.content)
+    usage, lock = get_usage_counter()
+    with lock:
+        for counter in filter(None, (usage, _run_usage.get())):
+            counter["requisicoes"] += 1
+            counter["tokens_prompt"] += prompt_tokens
+            counter["tokens_resposta"] += completion_tokens
+    return prompt_tokens, completion_tokens
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "http_status", None) or getattr(error, "status_code", None)
+    return status == 429 or "429" in str(error) or "rate limit" in str(error).lower()
+
+def call_lm(messages):
+    """
+    Chama o modelo de chat. Se a API responder 429 (limite de requisições),
+    tenta novamente com espera exponencial e um pequeno componente aleatório.
+    """
+    with span("llm") as attrs:
+        for attempt in range(LLM_MAX_RETRIES):
+            attrs["tentativas"] = attempt + 1
+            try:
+                response = get_lm().invoke(messages)
+                attrs["tokens_prompt"], attrs["tokens_resposta"] = _record_usage(messages, response)
+                return response
+            except Exception as e:
+                if not _is_rate_limit_error(e) or attempt == LLM_MAX_RETRIES - 1:
+                    raise
+                time.sleep(min(2 ** attempt, 30) + random.uniform(0, 1))
+
+@st.cache_resource
+def get_latency_log():
+    """Tempo até o primeiro token e tempo total das respostas em streaming (últimas 500)."""
+    return deque(maxlen=500)
+
+def stream_lm(messages, timings: dict = None):
+    """
+    Versão em streaming de call_lm: gera o texto da resposta pedaço a pedaço.
+    Novas tentativas em caso de 429 só acontecem antes do primeiro pedaço.
+    Registra o tempo até o primeiro token e o tempo total em `timings` e no log de latência.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    for attempt in range(LLM_MAX_RETRIES):
+        try:
+            chunks = get_lm().stream(messages)
+            first = next(chunks, None)
+            while first is not None and not first.content:  # O primeiro pedaço costuma vir vazio
+                first = next(chunks, None)
+            break
+        except Exception as e:
+            if not _is_rate_limit_error(e) or attempt == LLM_MAX_RETRIES - 1:
+                raise
+            time.sleep(min(2 ** attempt, 30) + random.uniform(0, 1))
+    timings["primeiro_token"] = time.perf_counter() - start
+
+    parts = []
+    for chunk in itertools.chain([first] if first is not None else [], chunks):
+        parts.append(chunk.content)
+        yield chunk.content
+    timings["total"] = time.perf_counter() - start
+    prompt_tokens, completion_tokens = _record_usage(messages, AIMessage(content="".join(parts)))
+    get_latency_log().append(dict(timings))
+    record(
+        "llm_stream", timings["total"], tentativas=attempt + 1, primeiro_token_ms=timings["primeiro_token"] * 1000,
+        tokens_prompt=prompt_tokens, tokens_resposta=completion_tokens,
+    )
+
+VALIDATION_CACHE_MAX_ENTRIES = int(os.getenv("VALIDATION_CACHE_MAX_ENTRIES", 20_000))
+
+class LRUCache(OrderedDict):
+    """
+    Dicionário com descarte do menos usado (LRU) acima de `max_entries`.
+    Não tem lock próprio: quem usa já acessa sob o lock de get_validation_cache.
+    """
+
+    def __init__(self, max_entries: int):
+        super().__init__()
+        self.max_entries = max_entries
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_entries:
+            self.popitem(last=False)
+
+@st.cache_resource
+def get_validation_cache():
+    """Resultados da validação por (codigo, contexto), compartilhados entre execuções e threads (LRU)."""
+    return LRUCache(VALIDATION_CACHE_MAX_ENTRIES), threading.Lock()
 
 def is_valid_product_context(context: str) -> bool:
     """
@@ -164,32 +453,134 @@ def is_valid_product_context(context: str) -> bool:
         f"Esse trecho descreve um produto real (com informações sobre características, aplicações ou especificações) e não apenas dados irrelevantes? Responda apenas 'sim' ou 'não'."
     )
     message = HumanMessage(content=prompt)
-    response = lm([message])
+    response = call_lm([message])
     answer = response.content.strip().lower()
     return answer.startswith("sim")
 
-def lookup_product(code: str, context: str) -> str:
+def pack_batches(contexts: list, token_budget: int = LLM_BATCH_TOKEN_BUDGET,
+                 max_items: int = LLM_BATCH_MAX_ITEMS) -> list:
+    """
+    Agrupa os contextos em lotes cujo tamanho estimado não ultrapassa o orçamento de tokens.
+    """
+    batches, batch, used = [], [], 0
+    for context in contexts:
+        cost = estimate_tokens(context) + 4  # Numeração e aspas de cada item
+        if batch and (used + cost > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(context)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _parse_batch_verdicts(answer: str, count: int) -> dict:
+    verdicts = {}
+    for match in re.finditer(r"^\W*(\d+)\W+(sim|não|nao)\b", answer, re.IGNORECASE | re.MULTILINE):
+        number = int(match.group(1))
+        if 1 <= number <= count and number not in verdicts:
+            verdicts[number] = match.group(2).lower() == "sim"
+    return verdicts
+
+def is_valid_product_context_batch(contexts: list) -> list:
+    """
+    Versão em lote de is_valid_product_context: envia vários trechos numerados em uma única
+    requisição e lê um veredito 'sim'/'não' por item. Itens sem veredito reconhecível na
+    resposta são validados individualmente.
+    """
+    if len(contexts) == 1:
+        return [is_valid_product_context(contexts[0])]
+
+    items = "\n".join(f"{number}. \"{context}\"" for number, context in enumerate(contexts, 1))
+    prompt = (
+        f"Você é um especialista em análise de textos de produtos marítimos. Para cada trecho numerado abaixo, "
+        f"diga se ele descreve um produto real (com informações sobre características, aplicações ou especificações) "
+        f"e não apenas dados irrelevantes.\n\n"
+        f"{items}\n\n"
+        f"Responda com uma linha por trecho, no formato 'número: sim' ou 'número: não', sem nenhum outro texto."
+    )
+    response = call_lm([HumanMessage(content=prompt)])
+    verdicts = _parse_batch_verdicts(response.content, len(contexts))
+    return [
+        verdicts[number] if number in verdicts else is_valid_product_context(context)
+        for number, context in enumerate(contexts, 1)
+    ]
+
+def validate_candidates(pairs: list) -> list:
+    """
+    Valida vários (codigo, contexto) com requisições em lote e guarda cada resultado no cache.
+    """
+    verdicts = []
+    batches = pack_batches([context for _, context in pairs])
+    with span("validacao_lote", itens=len(pairs), lotes=len(batches)):
+        for batch in batches:
+            verdicts += is_valid_product_context_batch(batch)
+    cache, lock = get_validation_cache()
+    with lock:
+        for pair, valid in zip(pairs, verdicts):
+            cache[pair] = valid
+    return verdicts
+
+def validate_candidate(code: str, context: str) -> bool:
+    """
+    Valida o contexto de um código no máximo uma vez: o resultado fica guardado por (codigo, contexto).
+    """
+    cache, lock = get_validation_cache()
+    key = (code, context)
+    with span("validacao") as attrs:
+        with lock:
+            if key in cache:
+                attrs["cache"] = "acerto"
+                return cache[key]
+        attrs["cache"] = "falha"
+        valid = is_valid_product_context(context)
+        with lock:
+            cache[key] = valid
+        return valid
+
+def _with_suffix(chunks, suffix: str):
+    yield from chunks
+    if suffix:
+        yield suffix
+
+def _product_explanation(prompt: str, suffix: str, stream: bool):
+    messages = [HumanMessage(content=prompt)]
+    if stream:
+        return _with_suffix(stream_lm(messages), suffix)
+    return call_lm(messages).content.strip() + suffix
+
+def lookup_product(code: str, context: str, validate: bool = True, stream: bool = False):
     """
     Tenta identificar o produto usando o código IMPA e o contexto extraído.
-    Se a consulta com o código retornar uma descrição válida (mínimo 20 caracteres),
+    O código é procurado primeiro no índice exato do catálogo; só se ele não existir
+    é feita a busca por similaridade. Se a consulta com o código retornar uma descrição válida (mínimo 20 caracteres),
     gera uma breve explicação que inclui o código. Caso contrário, tenta com o contexto
     sozinho e informa que o código não foi localizado.
     Se não houver informação válida, retorna string vazia.
+    Com validate=False a validação do contexto pelo modelo é dispensada (candidato já aprovado).
+    Com stream=True a explicação é retornada como um gerador de pedaços de texto.
     """
-    if not is_valid_product_context(context):
+    if validate and not validate_candidate(code, context):
         return ""
-    
-    query_with_code = f"IMPA {code} {context}"
-    info_with_code = retrieve_info(query_with_code)
+    with span("lookup_product") as attrs:
+        return _lookup_product(code, context, stream, attrs)
+
+def _lookup_product(code: str, context: str, stream: bool, attrs: dict):
+    # Busca exata pelo código no catálogo; a busca vetorial só é usada se o código não existir
+    catalog_row = load_catalog_index().get(code)
+    attrs["busca"] = "catalogo" if catalog_row else "similaridade"
+    if catalog_row:
+        info_with_code = [catalog_row]
+    else:
+        query_with_code = f"IMPA {code} {context}"
+        info_with_code = retrieve_info(query_with_code)
     if info_with_code and len(info_with_code[0].strip()) >= 20:
         prompt = (
             f"Você é uma vendedora de materiais marítimos. Com base na seguinte descrição de um produto:\n\n"
             f"{info_with_code[0]}\n\n"
             f"Forneça uma explicação breve e clara sobre esse produto, destacando suas principais características e aplicações."
         )
-        sales_message = HumanMessage(content=prompt)
-        sales_response = lm([sales_message])
-        return sales_response.content.strip() + f"\n(Código IMPA: {code})"
+        return _product_explanation(prompt, f"\n(Código IMPA: {code})", stream)
     else:
         info_without_code = retrieve_info(context)
         if info_without_code and len(info_without_code[0].strip()) >= 20:
@@ -199,14 +590,146 @@ def lookup_product(code: str, context: str) -> str:
                 f"Forneça uma explicação breve e clara sobre esse produto, destacando suas principais características e aplicações.\n"
                 f"(Observação: o código IMPA não foi localizado no arquivo.)"
             )
-            sales_message = HumanMessage(content=prompt)
-            sales_response = lm([sales_message])
-            return sales_response.content.strip()
+            return _product_explanation(prompt, "", stream)
         else:
             return ""
 
+def _release_when_done(chunks, slots):
+    try:
+        yield from chunks
+    finally:
+        slots.release()
+
+SLOT_WAIT_INTERVAL = 0.1  # Segundos entre as verificações de cancelamento enquanto espera uma vaga
+
+def identify_items(candidates: list, concurrency: int = LLM_CONCURRENCY, stream: bool = False):
+    """
+    Identifica os produtos de uma lista de (codigo, contexto, pre_aprovado) em paralelo,
+    com no máximo `concurrency` chamadas simultâneas ao modelo. Pares repetidos são
+    processados uma única vez e os que ainda precisam de validação são enviados em lotes.
+    Gera (codigo, contexto, produto) conforme cada item termina;
+    produto é None quando o contexto não descreve um produto.
+    Com stream=True, o produto é um gerador de texto entregue assim que chega o primeiro token;
+    a vaga de concorrência daquela requisição só é liberada quando o gerador termina ou é fechado.
+    Se a execução for interrompida (erro em uma tarefa ou quem consome parar de ler),
+    as tarefas na fila são canceladas e os streams ainda abertos são fechados.
+    """
+    slots = threading.BoundedSemaphore(concurrency)  # Requisições ao modelo em andamento, inclusive streams
+    aborted = threading.Event()
+    streams = []  # Streams abertos pelas threads, fechados se a execução for interrompida
+    streams_lock = threading.Lock()
+
+    def acquire_slot():
+        while not slots.acquire(timeout=SLOT_WAIT_INTERVAL):
+            if aborted.is_set():
+                return False
+        return True
+
+    def lookup(code, context):
+        if not acquire_slot():
+            return ""
+        streaming = False
+        try:
+            product = lookup_product(code, context, False, stream)
+            if stream and not isinstance(product, str):
+                # A requisição começa aqui, na thread; o restante do texto é lido por quem exibe
+                product = _release_when_done(product, slots)
+                streaming = True
+                first = next(product, "")
+                with streams_lock:
+                    if aborted.is_set():
+                        product.close()
+                    else:
+                        streams.append(product)
+                product = itertools.chain([first], product)
+            return product
+        finally:
+            if not streaming:
+                slots.release()
+
+    def validate(pairs):
+        if not acquire_slot():
+            return []
+        try:
+            return validate_candidates(pairs)
+        finally:
+            slots.release()
+
+    cache, lock = get_validation_cache()
+    to_lookup, to_validate, rejected = [], [], []
+    for code, context, pre_approved in dict.fromkeys(candidates):
+        with lock:
+            cached = cache.get((code, context))
+        if pre_approved or cached:
+            to_lookup.append((code, context))
+        elif cached is None:
+            to_validate.append((code, context))
+        else:
+            rejected.append((code, context))
+
+    for code, context in rejected:
+        yield code, context, None
+
+    # As threads herdam o contexto da sessão para poder usar os caches do Streamlit
+    with ThreadPoolExecutor(
+        max_workers=concurrency,
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx()),
+    ) as executor:
+        def submit(function, *args):
+            # Cada tarefa roda com uma cópia do contexto atual: trace das métricas e uso da execução
+            return executor.submit(contextvars.copy_context().run, function, *args)
+
+        pending = {}
+        finished = False
+        try:
+            for code, context in to_lookup:
+                pending[submit(lookup, code, context)] = ("produto", (code, context))
+            start = 0
+            for batch in pack_batches([context for _, context in to_validate]):
+                pairs = to_validate[start:start + len(batch)]
+                start += len(batch)
+                pending[submit(validate, pairs)] = ("validacao", pairs)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, payload = pending.pop(future)
+                    if kind == "produto":
+                        code, context = payload
+                        yield code, context, future.result()
+                        continue
+                    for (code, context), valid in zip(payload, future.result()):
+                        if valid:
+                            pending[submit(lookup, code, context)] = ("produto", (code, context))
+                        else:
+                            yield code, context, None
+            finished = True
+        finally:
+            if not finished:
+                # Sem isso as threads na fila esperariam para sempre pelas vagas presas nos streams
+                # não lidos, e o encerramento do executor esperaria por elas
+                with streams_lock:
+                    aborted.set()
+                for future in pending:
+                    future.cancel()
+                for chunks in streams:
+                    chunks.close()
+
 # ------------------------ INICIALIZA O MODELO DE CHAT ------------------------
-lm = ChatOpenAI(temperature=0, model="gpt-4o-mini")
+@st.cache_resource
+def get_lm():
+    """
+    Modelo de chat, criado no primeiro uso.
+    LLM_PROVIDER=fake usa um modelo local e determinístico (testes e benchmarks, ver modelos_fake.py).
+    """
+    if os.getenv("LLM_PROVIDER", "openai") == "fake":
+        from modelos_fake import FakeChatModel
+        return FakeChatModel()
+
+    from langchain_community.chat_models import ChatOpenAI
+
+    return ChatOpenAI(temperature=0, model="gpt-4o-mini")
 
 # ------------------------ TEMPLATE DA ASSISTENTE ------------------------
 template = """Você é uma assistente virtual altamente especializada que trabalha para a NavSupply, uma empresa de vendas marítimas. Seu papel é apoiar os compradores de materiais da empresa, respondendo a dúvidas e fornecendo informações precisas sobre temas relacionados ao setor marítimo. Para desempenhar essa função, você deve possuir amplo conhecimento em diversas áreas, incluindo:
@@ -222,60 +745,188 @@ Sua comunicação deve ser clara, objetiva e precisa, de modo a fornecer respost
 Além disso, se a consulta estiver relacionada a algum material específico, forneça uma descrição detalhada sobre sua aplicação e para que ele é utilizado, de modo a ajudar o comprador que não conhece o material."""
  
 # ------------------------ INTERFACE DE CHAT ------------------------
-st.title("Assistente Virtual NavSupply")
-st.markdown('<div class="chat-container">', unsafe_allow_html=True)
+def wait_warmup_with_spinner():
+    if not get_warmup()["pronto"].is_set():
+        with st.spinner("Aguardando o carregamento do índice do catálogo..."):
+            wait_warmup()
 
-# Histórico de conversa (armazenado na sessão)
-if "conversation" not in st.session_state:
-    st.session_state.conversation = []
+def render_chat(warmup: dict):
+    st.title("Assistente Virtual NavSupply")
 
-for message in st.session_state.conversation:
-    if message["role"] == "user":
-        st.chat_message("user").write(message["content"])
-    else:
-        st.chat_message("assistant").write(message["content"])
+    # O aviso do carregamento em segundo plano é atualizado a cada segundo até terminar
+    @st.fragment(run_every=1 if warmup["status"] == "carregando" else None)
+    def show_warmup_status(loading_at_start: bool):
+        state = get_warmup()
+        if state["status"] == "carregando":
+            st.info("Carregando o catálogo e o índice vetorial em segundo plano. O chat já pode ser usado.")
+        elif loading_at_start:
+            st.rerun()  # Atualiza a página inteira (e encerra a verificação periódica)
+        elif state["status"] == "erro":
+            st.error(state["mensagem"])
+            discard_failed_warmup(state)
+        else:
+            st.info(state["mensagem"])
 
-user_input = st.chat_input("Digite sua pergunta:")
+    show_warmup_status(warmup["status"] == "carregando")
+    st.markdown('<div class="chat-container">', unsafe_allow_html=True)
 
-if user_input:
-    st.session_state.conversation.append({"role": "user", "content": user_input})
-    st.chat_message("user").write(user_input)
-    
-    context_info = retrieve_info(user_input)
-    if not context_info or all(not item.strip() for item in context_info):
-        web_results = google_search(user_input)
-        web_context = "\n".join(web_results)
-        final_context = f"Resultados da Web:\n{web_context}"
-    else:
-        final_context = "Contexto do CSV:\n" + "\n".join(context_info)
+    # Histórico de conversa (armazenado na sessão)
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = []
+
+    for message in st.session_state.conversation:
+        if message["role"] == "user":
+            st.chat_message("user").write(message["content"])
+        else:
+            st.chat_message("assistant").write(message["content"])
+
+    user_input = st.chat_input("Digite sua pergunta:")
+
+    if user_input:
+        st.session_state.conversation.append({"role": "user", "content": user_input})
+        st.chat_message("user").write(user_input)
     
-    full_prompt = f"{template}\n\n{final_context}\n\nPergunta: {user_input}"
-    messages = [HumanMessage(content=full_prompt)]
-    response = lm(messages)
-    answer = response.content
+        # Cada pergunta é um trace: as etapas abaixo ficam registradas nas métricas de latência
+        with trace("chat"):
+            wait_warmup_with_spinner()
+            context_info = retrieve_info(user_input)
+            if not context_info or all(not item.strip() for item in context_info):
+                from busca_web import format_results
+
+                # A busca (e a leitura das páginas) tem prazo máximo; o que não chegar a tempo fica de fora
+                web_timings = {}
+                with st.spinner("Buscando na web..."):
+                    web_results = get_web_search().search(user_input, web_timings)
+                if web_timings.get("erro"):
+                    st.warning(f"Erro ao buscar na web: {web_timings['erro']}")
+                elif web_timings.get("esgotado"):
+                    st.caption(f"A busca na web atingiu o tempo limite ({web_timings['total']:.1f}s); usando os resultados obtidos até então.")
+                web_context = format_results(web_results) or "Nenhum resultado encontrado."
+                final_context = f"Resultados da Web:\n{web_context}"
+            else:
+                final_context = "Contexto do CSV:\n" + "\n".join(context_info)
     
-    st.session_state.conversation.append({"role": "assistant", "content": answer})
-    st.chat_message("assistant").write(answer)
+            # Perguntas repetidas (ou quase iguais) com o mesmo contexto são respondidas pelo cache
+            answer_cache = get_answer_cache()
+            with span("cache_respostas") as attrs:
+                answer = answer_cache.get(user_input, final_context)
+                attrs["cache"] = "falha" if answer is None else "acerto"
+            with st.chat_message("assistant"):
+                if answer is None:
+                    full_prompt = f"{template}\n\n{final_context}\n\nPergunta: {user_input}"
+                    messages = [HumanMessage(content=full_prompt)]
+                    timings = {}
+                    answer = st.write_stream(stream_lm(messages, timings))
+                    answer_cache.put(user_input, final_context, answer)
+                    st.caption(f"Primeiro token em {timings['primeiro_token']:.2f}s, resposta completa em {timings['total']:.2f}s")
+                else:
+                    st.write(answer)
+
+        st.session_state.conversation.append({"role": "assistant", "content": answer})
 
-st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def render_sidebar(warmup: dict):
+    with st.sidebar.expander("Tempos de inicialização"):
+        for phase, seconds in get_startup_timings().items():
+            st.write(f"{phase}: {seconds:.2f}s")
+    if warmup["status"] == "pronto":
+        cache_stats = get_vectorstore().embedding_function.stats()
+        st.sidebar.caption(
+            f"Cache de embeddings: {cache_stats['acertos']} acertos, "
+            f"{cache_stats['falhas']} falhas, {cache_stats['entradas']} entradas"
+        )
+        answer_stats = get_answer_cache().stats()
+        st.sidebar.caption(
+            f"Cache de respostas: {answer_stats['acertos']} acertos, "
+            f"{answer_stats['falhas']} falhas, {answer_stats['entradas']} entradas"
+        )
+    web_stats = get_web_search().stats()
+    if web_stats["acertos"] or web_stats["falhas"]:
+        st.sidebar.caption(
+            f"Busca na web: {web_stats['acertos']} acertos no cache, {web_stats['falhas']} buscas, "
+            f"{web_stats['tempo_esgotado']} no tempo limite, {web_stats['erros']} erros"
+        )
+    latency_log = list(get_latency_log())
+    if latency_log:
+        st.sidebar.caption(
+            f"Streaming ({len(latency_log)} respostas): primeiro token em média "
+            f"{sum(t['primeiro_token'] for t in latency_log) / len(latency_log):.2f}s, resposta completa em "
+            f"{sum(t['total'] for t in latency_log) / len(latency_log):.2f}s"
+        )
 
 # ------------------------ UPLOAD E PROCESSAMENTO DE PDF ------------------------
-st.header("Anexar PDFs para identificar itens")
-uploaded_files = st.file_uploader("Selecione um ou mais arquivos PDF", type=["pdf"], accept_multiple_files=True)
-
-if uploaded_files:
-    for uploaded_file in uploaded_files:
-        st.subheader(f"Processando arquivo: {uploaded_file.name}")
-        pdf_results = process_pdf(uploaded_file)
-        if pdf_results:
-            for code, context in pdf_results:
-                if is_valid_product_context(context):
-                    st.write(f"**Código IMPA encontrado:** {code}")
-                    st.write(f"**Contexto extraído:** {context}")
-                    product_info = lookup_product(code, context)
-                    if product_info:
-                        st.write("**Produto Identificado:**")
-                        st.write(product_info)
-                        st.markdown("---")
-        else:
-            st.write("Nenhum código IMPA encontrado neste arquivo.")
+def render_pdf_upload():
+    st.header("Anexar PDFs para identificar itens")
+    uploaded_files = st.file_uploader("Selecione um ou mais arquivos PDF", type=["pdf"], accept_multiple_files=True)
+
+    if uploaded_files:
+        from pdf_extrator import process_pdfs
+
+        wait_warmup_with_spinner()
+        # Os arquivos são distribuídos no pool e exibidos conforme cada um termina
+        files = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+        pool = get_pdf_pool() if len(files) > 1 else None
+        results = process_pdfs(files, pool)
+        while True:
+            # Tempo em que a interface ficou esperando a extração deste arquivo
+            wait_start = time.perf_counter()
+            item = next(results, None)
+            if item is None:
+                break
+            file_name, pdf_results, error = item
+            with trace("pdf", arquivo=file_name):
+                record(
+                    "pdf_extracao", time.perf_counter() - wait_start, "erro" if error else "ok",
+                    codigos=len(pdf_results), pool=pool is not None,
+                )
+                st.subheader(f"Processando arquivo: {file_name}")
+                if error:
+                    st.error(f"Erro ao ler o PDF {file_name}: {error}")
+                    continue
+                if pdf_results:
+                    accepted, ambiguous, stats = filter_candidates(pdf_results, load_catalog_index())
+                    st.caption(
+                        f"Candidatos: {stats['candidatos']} | "
+                        f"descartados (formato): {stats['descartados_formato']} | "
+                        f"descartados (pontuação): {stats['descartados_pontuacao']} | "
+                        f"aceitos sem LLM: {stats['aceitos_sem_llm']} | "
+                        f"enviados ao LLM: {stats['enviados_llm']}"
+                    )
+                    candidates = [(code, context, True) for code, context in accepted]
+                    candidates += [(code, context, False) for code, context in ambiguous]
+                    with track_usage() as usage:
+                        for code, context, product_info in identify_items(candidates, stream=True):
+                            if product_info is None:
+                                continue
+                            st.write(f"**Código IMPA encontrado:** {code}")
+                            st.write(f"**Contexto extraído:** {context}")
+                            if product_info:
+                                st.write("**Produto Identificado:**")
+                                st.write_stream(product_info)
+                                st.markdown("---")
+                    st.caption(
+                        f"Requisições ao modelo: {usage['requisicoes']} | "
+                        f"tokens enviados: {usage['tokens_prompt']} | "
+                        f"tokens recebidos: {usage['tokens_resposta']}"
+                    )
+                else:
+                    st.write("Nenhum código IMPA encontrado neste arquivo.")
+
+def main():
+    st.set_page_config(
+        page_title="Assistente Virtual NavSupply",
+        layout="wide"
+    )
+    st.markdown(css, unsafe_allow_html=True)
+    # O carregamento dos índices roda em segundo plano; a interface aparece sem esperar por ele
+    warmup = get_warmup()
+    render_chat(warmup)
+    record_startup_phase("primeira_tela", time.perf_counter() - _import_start)
+    render_sidebar(warmup)
+    render_pdf_upload()
+
+# O Streamlit executa este arquivo como __main__. Quando ele é importado como módulo
+# (ex.: processar_lote.py), só as funções são carregadas, sem montar a interface
+if __name__ == "__main__":
+    main()
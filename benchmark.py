@@ -0,0 +1,358 @@
+"""
+Benchmark offline do assistente: roda sem OpenAI, Google ou caixas de e-mail.
+Usa os modelos falsos de modelos_fake.py (com latência configurável), um catálogo sintético
+ampliado a partir do merged_data.csv e cotações em PDF geradas, e mede:
+    load_documents, get_vectorstore (índice gerado do zero e carregado do disco), retrieve_info,
+    process_pdf, extração em pool e o fluxo completo de identificação dos PDFs.
+
+    python benchmark.py                                  # roda e grava benchmark_resultados.json
+    python benchmark.py --linhas 20000 --pdfs 30         # catálogo e lote maiores
+    python benchmark.py --salvar-baseline                # grava benchmark_baseline.json
+Quando existe um baseline com os mesmos parâmetros, os resultados são comparados com ele e o
+comando termina com código 1 se alguma etapa ficar mais lenta que a tolerância. Com um baseline
+de outros parâmetros a comparação não é feita e o código de saída é 3.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import logging
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+
+RESULTS_FILE = "benchmark_resultados.json"
+BASELINE_FILE = "benchmark_baseline.json"
+BASE_CATALOGS = ("merged_data.csv", "merged_data2.csv", "merged_data.xlsx")
+RESULTS_VERSION = 1
+EXIT_PARAMETERS_DIFFER = 3  # Código de saída quando o baseline não é comparável
+
+# ------------------------ DADOS SINTÉTICOS ------------------------
+def synthetic_catalog(base_path: str, rows: int, seed: int = 0) -> list:
+    """
+    Amplia o catálogo base até `rows` linhas: as linhas originais são mantidas e as cópias
+    recebem códigos IMPA novos (6 dígitos, sem repetição) e uma variação na descrição.
+    """
+    from catalogo import CODE_COLUMN, normalize_value, read_catalog_rows
+
+    base = [
+        {key: normalize_value(value) for key, value in row.items() if key and not key.startswith("Unnamed")}
+        for row in read_catalog_rows(base_path)
+    ]
+    base = [row for row in base if row.get(CODE_COLUMN)]
+    rng = random.Random(seed)
+    used = {row[CODE_COLUMN] for row in base}
+    result = base[:rows]
+    copy = 0
+    while len(result) < rows:
+        copy += 1
+        for row in base:
+            if len(result) >= rows:
+                break
+            code = f"{rng.randrange(100000, 1000000)}"
+            while code in used:
+                code = f"{rng.randrange(100000, 1000000)}"
+            used.add(code)
+            new_row = {
+                key: f"{value} - MODELO {copy}" if key != CODE_COLUMN and value else value
+                for key, value in row.items()
+            }
+            new_row[CODE_COLUMN] = code
+            result.append(new_row)
+    return result
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, lines: list, lines_per_page: int = 60):
+    """Grava um PDF simples (Helvetica, uma linha de texto por linha) sem depender de bibliotecas."""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page_lines in pages:
+        text = "BT /F1 9 Tf 40 800 Td 12 TL " + " ".join(f"({_pdf_escape(line)}) '" for line in page_lines) + " ET"
+        stream = text.encode("cp1252", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    output, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(output))
+        body = obj if isinstance(obj, bytes) else obj.encode("latin-1")
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(output)
+
+def synthetic_quotations(directory: str, catalog_rows: list, count: int, items: int, seed: int = 0) -> list:
+    """
+    Gera `count` cotações em PDF com `items` itens cada: a maioria com códigos do catálogo,
+    alguns códigos inexistentes e números que não são códigos (telefone, CEP, pedido).
+    """
+    from catalogo import CODE_COLUMN
+
+    rng = random.Random(seed)
+    description_column = next(
+        (key for key in catalog_rows[0] if "INGL" in key.upper()),
+        next(key for key in catalog_rows[0] if key != CODE_COLUMN),
+    )
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number in range(1, count + 1):
+        lines = [
+            f"COTACAO {number:04d} - FORNECEDOR MARITIMO LTDA",
+            f"TEL 21 {rng.randrange(100000, 999999)} CEP {rng.randrange(200000, 299999)}",
+            f"PEDIDO {rng.randrange(100000, 999999)} DATA 10/03/2025",
+            "",
+            "ITEM  CODIGO  DESCRICAO  UN  QTD",
+        ]
+        for item in range(1, items + 1):
+            if rng.random() < 0.1:
+                code, description = f"{rng.randrange(100000, 1000000)}", "ITEM SEM CADASTRO"
+            else:
+                row = rng.choice(catalog_rows)
+                code, description = row[CODE_COLUMN], row[description_column] or "ITEM"
+            lines.append(f"{item} {code} {description[:70]} - PC {rng.randint(1, 50)}")
+        lines += ["", f"TOTAL GERAL R$ {rng.randint(1000, 99999)},00", "PAGINA 1 / 1"]
+        path = os.path.join(directory, f"cotacao_{number:04d}.pdf")
+        write_pdf(path, lines)
+        paths.append(path)
+    return paths
+
+def synthetic_queries(catalog_rows: list, count: int, seed: int = 0) -> list:
+    """Perguntas do chat: metade cita o código IMPA, metade usa só palavras da descrição."""
+    from catalogo import CODE_COLUMN
+
+    rng = random.Random(seed)
+    queries = []
+    for position in range(count):
+        row = rng.choice(catalog_rows)
+        description = " ".join(v for k, v in row.items() if k != CODE_COLUMN).split()
+        if position % 2 == 0:
+            queries.append(f"O que é o IMPA {row[CODE_COLUMN]}?")
+        else:
+            queries.append("Para que serve " + " ".join(description[:5]).lower() + "?")
+    return queries
+
+# ------------------------ MEDIÇÕES ------------------------
+def _stats(samples: list, **extra) -> dict:
+    values = np.array(samples) * 1000
+    return {
+        "amostras": len(samples),
+        "mediana_ms": round(float(np.median(values)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "min_ms": round(float(values.min()), 3),
+        "max_ms": round(float(values.max()), 3),
+        **extra,
+    }
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def run_benchmarks(args) -> dict:
+    """Prepara os dados sintéticos no diretório de trabalho e roda as medições. Retorna os resultados."""
+    import agente
+    from catalogo import compiled_path, load_catalog_documents, write_catalog_csv
+    from cache_embeddings import CACHE_FILE
+    from indice_vetorial import INDEX_DIR
+    from pdf_extrator import create_pool, process_pdfs
+
+    rows = synthetic_catalog(args.base, args.linhas, args.semente)
+    write_catalog_csv(rows, agente.CATALOG_FILE)
+    pdf_paths = synthetic_quotations("cotacoes", rows, args.pdfs, args.itens, args.semente)
+    queries = synthetic_queries(rows, args.consultas, args.semente)
+    results = {}
+
+    def step(name, result):
+        results[name] = result
+        print(f"{name:<24} mediana {result['mediana_ms']:>10.2f} ms   p95 {result['p95_ms']:>10.2f} ms")
+
+    # load_documents: catálogo compilado do zero e lido do arquivo Arrow já compilado
+    samples = []
+    for _ in range(args.repeticoes):
+        _remove(compiled_path(agente.CATALOG_FILE))
+        samples.append(_timed(load_catalog_documents, agente.CATALOG_FILE)[0])
+    step("load_documents_frio", _stats(samples, documentos=len(rows)))
+    fast_repetitions = args.repeticoes * 5  # Etapas de poucos ms: mais amostras para uma mediana estável
+    step("load_documents", _stats([_timed(load_catalog_documents, agente.CATALOG_FILE)[0] for _ in range(fast_repetitions)]))
+
+    # get_vectorstore: índice gerado do zero (sem cache de embeddings) e carregado do disco
+    samples = []
+    for _ in range(args.repeticoes_indice):
+        gc.collect()
+        _remove(INDEX_DIR, CACHE_FILE, CACHE_FILE + "-wal", CACHE_FILE + "-shm")
+        samples.append(_timed(agente.open_vectorstore)[0])
+    step("get_vectorstore_frio", _stats(samples))
+    step("get_vectorstore", _stats([_timed(agente.open_vectorstore)[0] for _ in range(fast_repetitions)]))
+
+    agente.wait_warmup()
+    step("retrieve_info", _stats([_timed(agente.retrieve_info, query)[0] for query in queries]))
+
+    # process_pdf: extração dos códigos, um arquivo por vez, e em pool de processos
+    samples = []
+    for path in pdf_paths:
+        with open(path, "rb") as f:
+            samples.append(_timed(agente.process_pdf, f)[0])
+    step("process_pdf", _stats(samples))
+    files = []
+    for path in pdf_paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    pool = create_pool(args.workers)
+    list(process_pdfs(files[:args.workers], pool))  # Sobe os processos antes de medir
+    samples = [_timed(lambda: list(process_pdfs(files, pool)))[0] for _ in range(fast_repetitions)]
+    pool.shutdown()
+    step("extracao_pool", _stats(samples, pdfs_por_minuto=round(len(files) / float(np.median(samples)) * 60, 1)))
+
+    # Fluxo completo: extração, filtro, validação em lote e identificação de cada PDF
+    extracted = list(process_pdfs(files))
+    usage, _ = agente.get_usage_counter()
+    samples, items, requests = [], 0, 0
+    for _ in range(args.repeticoes):
+        validation_cache, lock = agente.get_validation_cache()
+        with lock:
+            validation_cache.clear()
+        before = usage["requisicoes"]
+        start = time.perf_counter()
+        items = 0
+        for _, pdf_results, _ in extracted:
+            accepted, ambiguous, _ = agente.filter_candidates(pdf_results, agente.load_catalog_index())
+            candidates = [(code, context, True) for code, context in accepted]
+            candidates += [(code, context, False) for code, context in ambiguous]
+            items += sum(1 for _ in agente.identify_items(candidates))
+        samples.append(time.perf_counter() - start)
+        requests = usage["requisicoes"] - before
+    step("identificacao_pdf", _stats(samples, itens=items, requisicoes_llm=requests,
+                                     itens_por_segundo=round(items / float(np.median(samples)), 2)))
+    return results
+
+# ------------------------ COMPARAÇÃO COM O BASELINE ------------------------
+def compare(results: dict, baseline: dict, tolerance: float, slack_ms: float) -> list:
+    """
+    Compara a mediana de cada etapa com o baseline. Uma etapa é regressão quando fica mais de
+    `tolerance` (ex.: 0.2 = 20%) e mais de `slack_ms` mais lenta; a folga absoluta evita
+    acusar a variação normal das etapas de poucos milissegundos.
+    """
+    rows = []
+    for name, result in results["resultados"].items():
+        reference = baseline["resultados"].get(name)
+        if not reference:
+            continue
+        before, after = reference["mediana_ms"], result["mediana_ms"]
+        change = (after - before) / before if before else 0.0
+        rows.append({
+            "etapa": name, "baseline_ms": before, "atual_ms": after, "variacao": round(change, 3),
+            "regressao": after > before * (1 + tolerance) and after - before > slack_ms,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline da recuperação, leitura de PDFs e orquestração do modelo.")
+    parser.add_argument("--base", default=next((p for p in BASE_CATALOGS if os.path.exists(p)), BASE_CATALOGS[0]),
+                        help="Catálogo usado como base para o catálogo sintético.")
+    parser.add_argument("--linhas", type=int, default=5000, help="Linhas do catálogo sintético.")
+    parser.add_argument("--pdfs", type=int, default=10, help="Cotações em PDF geradas.")
+    parser.add_argument("--itens", type=int, default=20, help="Itens por cotação.")
+    parser.add_argument("--consultas", type=int, default=50, help="Perguntas para o retrieve_info.")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--repeticoes-indice", type=int, default=1, help="Repetições da geração do índice do zero.")
+    parser.add_argument("--workers", type=int, default=2, help="Processos do pool de extração.")
+    parser.add_argument("--latencia-llm", type=float, default=0.05, help="Segundos até o 1º pedaço da resposta do modelo falso.")
+    parser.add_argument("--latencia-token", type=float, default=0.001, help="Segundos por pedaço da resposta do modelo falso.")
+    parser.add_argument("--latencia-embeddings", type=float, default=0.02, help="Segundos por chamada de embeddings.")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", default=RESULTS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava os resultados como novo baseline.")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Aumento da mediana aceito antes de acusar regressão.")
+    parser.add_argument("--folga-ms", type=float, default=5.0, help="Aumento absoluto da mediana sempre aceito, em ms.")
+    parser.add_argument("--diretorio", default=None, help="Diretório de trabalho (padrão: temporário, apagado ao final).")
+    args = parser.parse_args()
+
+    args.base = os.path.abspath(args.base)
+    output, baseline_path = os.path.abspath(args.saida), os.path.abspath(args.baseline)
+    parameters = {
+        key: getattr(args, key) for key in (
+            "linhas", "pdfs", "itens", "consultas", "repeticoes", "repeticoes_indice", "workers",
+            "latencia_llm", "latencia_token", "latencia_embeddings", "semente",
+        )
+    }
+    parameters["catalogo_base"] = os.path.basename(args.base)
+
+    # Tudo offline: modelos falsos, busca na web local e métricas no diretório de trabalho
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "EMBEDDINGS_PROVIDER": "fake",
+        "WEB_SEARCH_PROVIDER": "stub",
+        "FAKE_LLM_LATENCY": str(args.latencia_llm),
+        "FAKE_LLM_TOKEN_LATENCY": str(args.latencia_token),
+        "FAKE_EMBEDDINGS_LATENCY": str(args.latencia_embeddings),
+    })
+    # Fora do Streamlit, cada thread sem sessão gera um aviso de "missing ScriptRunContext"
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    workdir = args.diretorio or tempfile.mkdtemp(prefix="benchmark_")
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    try:
+        results = {
+            "versao": RESULTS_VERSION,
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+            "parametros": parameters,
+            "resultados": run_benchmarks(args),
+        }
+    finally:
+        if not args.diretorio:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {output}")
+    if args.salvar_baseline:
+        shutil.copyfile(output, baseline_path)
+        print(f"Baseline gravado em {baseline_path}")
+        return
+    if not os.path.exists(baseline_path):
+        print("Sem baseline para comparar (use --salvar-baseline).")
+        return
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline_parameters = baseline.get("parametros") or {}
+    if baseline_parameters != parameters:
+        differ = sorted(key for key in set(parameters) | set(baseline_parameters)
+                        if parameters.get(key) != baseline_parameters.get(key))
+        print(f"O baseline foi gerado com outros parâmetros ({', '.join(differ)}); comparação não realizada.")
+        raise SystemExit(EXIT_PARAMETERS_DIFFER)
+    rows = compare(results, baseline, args.tolerancia, args.folga_ms)
+    for row in rows:
+        flag = "REGRESSÃO" if row["regressao"] else ""
+        print(f"{row['etapa']:<24} {row['baseline_ms']:>10.2f} -> {row['atual_ms']:>10.2f} ms ({row['variacao']:+.1%}) {flag}")
+    if any(row["regressao"] for row in rows):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,237 +1,526 @@
-import streamlit as st
-import pandas as pd
-import time
-import traceback
-import os
-from io import BytesIO
-
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    TimeoutException,
-    ElementClickInterceptedException,
-    NoSuchElementException
-)
-from webdriver_manager.chrome import ChromeDriverManager
-
-def encontrar_campo_busca(driver, tempo_espera=10):
-    """
-    Tenta encontrar o campo de busca. Caso não encontre no 'home' (//*[@id="P_ENTREE_HOME"]),
-    procura no cabeçalho (//*[@id="P_ENTREE_ENTETE"]).
-    """
-    try:
-        return WebDriverWait(driver, tempo_espera).until(
-            EC.presence_of_element_located((By.XPATH, '//*[@id="P_ENTREE_HOME"]'))
-        )
-    except TimeoutException:
-        return WebDriverWait(driver, tempo_espera).until(
-            EC.presence_of_element_located((By.XPATH, '//*[@id="P_ENTREE_ENTETE"]'))
-        )
-
-def iniciar_driver():
-    """
-    Tenta iniciar o WebDriver.
-    Se REMOTE_WEBDRIVER_URL estiver definida, utiliza o WebDriver remoto.
-    Caso contrário, tenta iniciar o driver local (que pode falhar no Streamlit Cloud).
-    """
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")  
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1920,1080")
-    
-    remote_url = os.environ.get("REMOTE_WEBDRIVER_URL")
-    if remote_url:
-        st.info("Usando WebDriver remoto em: " + remote_url)
-        try:
-            driver = webdriver.Remote(command_executor=remote_url, options=options)
-            return driver
-        except Exception as ex:
-            st.error("Erro ao iniciar o WebDriver remoto: " + str(ex))
-            return None
-    else:
-        st.info("Tentando iniciar o WebDriver local...")
-        # Verifica se há um binário do Chrome/Chromium
-        binary_path = os.environ.get("CHROMIUM_BINARY_PATH", "/usr/bin/chromium-browser")
-        if os.path.exists(binary_path):
-            options.binary_location = binary_path
-        else:
-            binary_path = os.environ.get("CHROMIUM_BINARY_PATH", "/usr/bin/chromium")
-            if os.path.exists(binary_path):
-                options.binary_location = binary_path
-            else:
-                st.error("Nenhum binário do Chromium encontrado. Defina a variável REMOTE_WEBDRIVER_URL para usar um driver remoto.")
-                return None
-        try:
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-            return driver
-        except Exception as e:
-            st.error("Erro ao iniciar o Chrome WebDriver local: " + str(e))
-            return None
-
-def processar_imos(df_imos):
-    driver = iniciar_driver()
-    if driver is None:
-        st.error("Não foi possível iniciar o WebDriver.")
-        return None
-
-    todos_os_dados = []
-    try:
-        # --- LOGIN ---
-        driver.get("http://www.equasis.org/")
-        time.sleep(3)
-        email_field = driver.find_element(By.XPATH, '//*[@id="home-login"]')
-        password_field = driver.find_element(By.XPATH, '//*[@id="home-password"]')
-        email_field.send_keys("mkt@navsupply.com.br")
-        password_field.send_keys("mKT@2025")
-        password_field.send_keys(Keys.RETURN)
-        time.sleep(5)
-
-        # --- LOOP para cada IMO ---
-        for imo in df_imos["IMO"]:
-            imo_str = str(imo).strip()
-            st.write(f"Processando IMO: {imo_str}")
-            try:
-                # 1) Encontrar o campo de busca
-                campo_busca = encontrar_campo_busca(driver, tempo_espera=10)
-                campo_busca.clear()
-                campo_busca.send_keys(imo_str)
-                campo_busca.send_keys(Keys.RETURN)
-                time.sleep(5)
-
-                # 2) Capturar o nome do navio no resultado da pesquisa
-                try:
-                    nome_navio_element = driver.find_element(By.XPATH, '//*[@id="ShipResultId"]/table/tbody/tr[1]/td[1]')
-                    nome_navio = nome_navio_element.text.strip()
-                    st.write(f"Nome do Navio capturado: {nome_navio}")
-                except NoSuchElementException:
-                    st.write("Nome do navio não encontrado. Tentando fechar alerta...")
-                    try:
-                        close_button = WebDriverWait(driver, 10).until(
-                            EC.element_to_be_clickable((By.XPATH, '//*[@id="warning"]/div/div/div[3]/button'))
-                        )
-                        close_button.click()
-                        st.write("Alerta fechado. Pulando este IMO...")
-                    except Exception as e:
-                        st.write("Erro ao fechar alerta:", e)
-                    continue
-
-                # 3) Clicar no link do IMO
-                xpath_imo_link = f"//a[contains(text(),'{imo_str}')]"
-                imo_link = WebDriverWait(driver, 15).until(
-                    EC.element_to_be_clickable((By.XPATH, xpath_imo_link))
-                )
-                driver.execute_script("arguments[0].scrollIntoView(true);", imo_link)
-                time.sleep(1)
-                imo_link.click()
-                st.write(f"Link contendo '{imo_str}' clicado com sucesso!")
-
-                # 4) Clicar no segundo elemento, se necessário
-                try:
-                    segundo_elemento = WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, '//*[@id="body"]/div[6]/div/div/div/div/div/div/div[2]/a/div/div/div[1]/div/div/div/div/div/div/h3'))
-                    )
-                    driver.execute_script("arguments[0].scrollIntoView(true);", segundo_elemento)
-                    time.sleep(1)
-                    try:
-                        segundo_elemento.click()
-                    except ElementClickInterceptedException:
-                        driver.execute_script("arguments[0].click();", segundo_elemento)
-                    st.write("Segundo elemento clicado com sucesso!")
-                except TimeoutException:
-                    st.write("Segundo elemento não encontrado/clicável. Pulando este IMO.")
-                    continue
-
-                time.sleep(5)  # Aguarda a página detalhada
-
-                # --- Extração da tabela (Manager, Owner e 'Compania') ---
-                try:
-                    tabela_xpath = '//*[@id="collapse3"]/div/div/div/div/div/div[1]/div[1]/div[3]/div/div/form/table/tbody'
-                    tabela_body = WebDriverWait(driver, 20).until(
-                        EC.presence_of_element_located((By.XPATH, tabela_xpath))
-                    )
-                    linhas = tabela_body.find_elements(By.TAG_NAME, "tr")
-                    for linha in linhas:
-                        try:
-                            celulas = linha.find_elements(By.TAG_NAME, "td")
-                            if len(celulas) >= 3:
-                                texto_manager_owner = celulas[1].text.strip()
-                                texto_compania = celulas[2].text.strip()
-                                lista_manager = []
-                                lista_owner = []
-                                partes = texto_manager_owner.split("\n")
-                                for parte in partes:
-                                    subpartes = parte.split("/") if "/" in parte else [parte]
-                                    for sub in subpartes:
-                                        sub = sub.strip()
-                                        if "manager" in sub.lower():
-                                            lista_manager.append(sub)
-                                        if "owner" in sub.lower():
-                                            lista_owner.append(sub)
-                                manager = " / ".join(lista_manager)
-                                owner = " / ".join(lista_owner)
-                                if not manager and not owner and partes:
-                                    manager = partes[0].strip()
-                                todos_os_dados.append({
-                                    "IMO": imo_str,
-                                    "Nome do Navio": nome_navio,
-                                    "Compania": texto_compania,
-                                    "Manager": manager,
-                                    "Owner": owner
-                                })
-                        except Exception as e:
-                            st.write("Erro ao processar uma linha da tabela:", e)
-                except TimeoutException:
-                    st.write(f"Não foi possível localizar a tabela para o IMO {imo_str}.")
-            except Exception as e:
-                st.write(f"[ERRO] Problema ao processar o IMO {imo_str}: {e}")
-                traceback.print_exc()
-                continue
-
-        df_resultado = pd.DataFrame(todos_os_dados)
-        return df_resultado
-    except Exception as e:
-        st.write("Erro crítico:", e)
-    finally:
-        driver.quit()
-        st.write("Navegador fechado.")
-
-# --- Interface do Streamlit ---
-st.title("Scraping de Dados - Equasis")
-
-uploaded_file = st.file_uploader("Selecione o arquivo Excel com a lista de IMOs", type=["xlsx", "xls"])
-if uploaded_file is not None:
-    try:
-        df_imos = pd.read_excel(BytesIO(uploaded_file.read()))
-        st.write("Arquivo carregado com sucesso!")
-        st.write(df_imos.head())
-    except Exception as e:
-        st.error("Erro ao ler o arquivo: " + str(e))
-
-if st.button("Iniciar Extração"):
-    if uploaded_file is None:
-        st.error("Por favor, faça o upload do arquivo Excel primeiro.")
-    else:
-        with st.spinner("Processando..."):
-            df_resultado = processar_imos(df_imos)
-            if df_resultado is not None and not df_resultado.empty:
-                st.success("Processo concluído!")
-                st.dataframe(df_resultado)
-                @st.cache_data
-                def convert_df(df):
-                    return df.to_excel(index=False).encode('utf-8')
-                resultado_excel = convert_df(df_resultado)
-                st.download_button(
-                    label="Baixar resultado em Excel",
-                    data=resultado_excel,
-                    file_name="resultado.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-            else:
-                st.warning("Nenhum dado foi extraído.")
+import streamlit as st
+import pandas as pd
+import traceback
+import os
+import time
+import queue
+import threading
+from io import BytesIO
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    TimeoutException,
+    ElementClickInterceptedException,
+    WebDriverException
+)
+from webdriver_manager.chrome import ChromeDriverManager
+
+import requests
+
+from cache_imos import ImoCache
+from equasis_http import EquasisHttp, UnrecognizedPage, no_timer, split_manager_owner
+from exportacao import COLUMNS, IncrementalExport, rows_to_xlsx
+from metricas import span, trace
+
+# EQUASIS_URL pode apontar para a imitação local (python equasis_mock.py) nos testes
+EQUASIS_URL = os.environ.get("EQUASIS_URL", "http://www.equasis.org/")
+EQUASIS_EMAIL = os.environ.get("EQUASIS_EMAIL", "mkt@navsupply.com.br")
+EQUASIS_PASSWORD = os.environ.get("EQUASIS_PASSWORD", "")
+SESSOES = int(os.environ.get("EQUASIS_SESSIONS", 3))  # Navegadores logados em paralelo
+TENTATIVAS_IMO = int(os.environ.get("EQUASIS_RETRIES", 3))  # Tentativas por IMO (sessão que cai ou página que não carrega)
+TEMPO_ESPERA = int(os.environ.get("EQUASIS_WAIT", 20))  # Espera máxima por página, em segundos
+# "http": lê o HTML direto, sem navegador, e usa o Selenium só nas páginas que não reconhecer
+MOTOR = os.environ.get("EQUASIS_ENGINE", "http")
+MOTORES = {"http": "HTTP (sem navegador)", "selenium": "Navegador (Selenium)"}
+
+XPATH_NOME_NAVIO = '//*[@id="ShipResultId"]/table/tbody/tr[1]/td[1]'
+XPATH_FECHAR_ALERTA = '//*[@id="warning"]/div/div/div[3]/button'
+XPATH_DETALHE = '//*[@id="body"]/div[6]/div/div/div/div/div/div/div[2]/a/div/div/div[1]/div/div/div/div/div/div/h3'
+XPATH_TABELA = '//*[@id="collapse3"]/div/div/div/div/div/div[1]/div[1]/div[3]/div/div/form/table/tbody'
+
+# Etapas medidas em cada IMO, na ordem em que acontecem
+ETAPAS = ["login", "busca", "clique_resultado", "pagina_detalhe", "leitura_tabela"]
+
+class PaginaIncompleta(Exception):
+    """
+    Uma página do IMO não mostrou o elemento esperado a tempo. O navegador continua utilizável:
+    o IMO é tentado de novo na mesma sessão, sem reiniciar o navegador.
+    """
+
+@st.cache_resource
+def get_cache_imos():
+    """Cache persistente por IMO, compartilhado entre as sessões do Streamlit."""
+    return ImoCache()
+
+class TemposEtapas:
+    """
+    Tempo gasto em cada etapa da extração, somado entre as sessões paralelas, para o resumo ao vivo.
+    Cada medição também vira um span "equasis_<etapa>" nas métricas (metricas_admin.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._duracoes = {etapa: [] for etapa in ETAPAS}
+
+    @contextmanager
+    def medir(self, etapa, **atributos):
+        inicio = time.perf_counter()
+        try:
+            with span(f"equasis_{etapa}", **atributos):
+                yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._lock:
+                self._duracoes.setdefault(etapa, []).append(duracao)
+
+    def resumo(self):
+        """Uma linha por etapa: quantidade, tempo total, média, p95 e fatia do tempo total."""
+        with self._lock:
+            duracoes = {etapa: list(valores) for etapa, valores in self._duracoes.items() if valores}
+        total = sum(sum(valores) for valores in duracoes.values()) or 1
+        linhas = []
+        for etapa, valores in duracoes.items():
+            valores.sort()
+            linhas.append({
+                "Etapa": etapa,
+                "Quantidade": len(valores),
+                "Total (s)": round(sum(valores), 2),
+                "Média (ms)": round(sum(valores) / len(valores) * 1000, 1),
+                "p95 (ms)": round(valores[min(len(valores) - 1, int(len(valores) * 0.95))] * 1000, 1),
+                "% do tempo": round(sum(valores) / total * 100, 1),
+            })
+        return pd.DataFrame(linhas)
+
+def log_streamlit(nivel, texto):
+    """
+    Mostra uma mensagem na página (nivel: "write", "info", "warning" ou "error").
+    """
+    getattr(st, nivel)(texto)
+
+def encontrar_campo_busca(driver, tempo_espera=10):
+    """
+    Encontra o campo de busca: o do 'home' (//*[@id="P_ENTREE_HOME"]) ou, nas demais páginas,
+    o do cabeçalho (//*[@id="P_ENTREE_ENTETE"]). Espera pelos dois ao mesmo tempo, para não
+    gastar o tempo de espera inteiro procurando o do 'home' em páginas que só têm o do cabeçalho.
+    """
+    return WebDriverWait(driver, tempo_espera).until(EC.any_of(
+        EC.presence_of_element_located((By.XPATH, '//*[@id="P_ENTREE_HOME"]')),
+        EC.presence_of_element_located((By.XPATH, '//*[@id="P_ENTREE_ENTETE"]')),
+    ))
+
+def iniciar_driver(log=log_streamlit):
+    """
+    Tenta iniciar o WebDriver.
+    Se REMOTE_WEBDRIVER_URL estiver definida, utiliza o WebDriver remoto.
+    Caso contrário, tenta iniciar o driver local (que pode falhar no Streamlit Cloud).
+    As mensagens vão para `log(nivel, texto)`, já que o driver pode ser iniciado fora da thread do Streamlit.
+    """
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")  
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    
+    remote_url = os.environ.get("REMOTE_WEBDRIVER_URL")
+    if remote_url:
+        log("info", "Usando WebDriver remoto em: " + remote_url)
+        try:
+            driver = webdriver.Remote(command_executor=remote_url, options=options)
+            return driver
+        except Exception as ex:
+            log("error", "Erro ao iniciar o WebDriver remoto: " + str(ex))
+            return None
+    else:
+        log("info", "Tentando iniciar o WebDriver local...")
+        # Verifica se há um binário do Chrome/Chromium
+        binary_path = os.environ.get("CHROMIUM_BINARY_PATH", "/usr/bin/chromium-browser")
+        if os.path.exists(binary_path):
+            options.binary_location = binary_path
+        else:
+            binary_path = os.environ.get("CHROMIUM_BINARY_PATH", "/usr/bin/chromium")
+            if os.path.exists(binary_path):
+                options.binary_location = binary_path
+            else:
+                log("error", "Nenhum binário do Chromium encontrado. Defina a variável REMOTE_WEBDRIVER_URL para usar um driver remoto.")
+                return None
+        try:
+            service = Service(ChromeDriverManager().install())
+            driver = webdriver.Chrome(service=service, options=options)
+            return driver
+        except Exception as e:
+            log("error", "Erro ao iniciar o Chrome WebDriver local: " + str(e))
+            return None
+
+def fazer_login(driver, medir=no_timer):
+    """
+    Abre o Equasis e faz login, esperando o campo de busca da área logada aparecer.
+    """
+    with medir("login"):
+        driver.get(EQUASIS_URL)
+        email_field = WebDriverWait(driver, TEMPO_ESPERA).until(
+            EC.presence_of_element_located((By.XPATH, '//*[@id="home-login"]'))
+        )
+        password_field = driver.find_element(By.XPATH, '//*[@id="home-password"]')
+        email_field.send_keys(EQUASIS_EMAIL)
+        password_field.send_keys(EQUASIS_PASSWORD)
+        password_field.send_keys(Keys.RETURN)
+        encontrar_campo_busca(driver, tempo_espera=TEMPO_ESPERA)
+
+def clicar(driver, elemento):
+    """
+    Rola até o elemento e clica; se outro elemento estiver por cima, clica via JavaScript.
+    """
+    driver.execute_script("arguments[0].scrollIntoView(true);", elemento)
+    try:
+        elemento.click()
+    except ElementClickInterceptedException:
+        driver.execute_script("arguments[0].click();", elemento)
+
+def extrair_imo(driver, imo_str, log=log_streamlit, medir=no_timer):
+    """
+    Busca um IMO na sessão já logada e retorna as linhas (IMO, navio, empresa, manager, owner).
+    Em vez de pausas fixas, espera cada elemento ficar pronto. Só retorna [] quando o site mostra o aviso
+    de IMO não encontrado; uma página que não carrega a tempo levanta PaginaIncompleta e erros do navegador
+    (sessão encerrada) são propagados, ambos para nova tentativa, sem que o IMO vá para o cache como vazio.
+    `medir(etapa)` cronometra a busca, o clique no resultado, a página do navio e a leitura da tabela.
+    """
+    # 1) Buscar o IMO e esperar a página nova trazer o resultado ou o alerta de "não encontrado"
+    try:
+        with medir("busca"):
+            campo_busca = encontrar_campo_busca(driver, tempo_espera=10)
+            campo_busca.clear()
+            campo_busca.send_keys(imo_str)
+            campo_busca.send_keys(Keys.RETURN)
+            WebDriverWait(driver, TEMPO_ESPERA).until(EC.staleness_of(campo_busca))
+            resultado = WebDriverWait(driver, TEMPO_ESPERA).until(EC.any_of(
+                EC.presence_of_element_located((By.XPATH, XPATH_NOME_NAVIO)),
+                EC.element_to_be_clickable((By.XPATH, XPATH_FECHAR_ALERTA)),
+            ))
+    except TimeoutException:
+        raise PaginaIncompleta("a busca não mostrou o resultado nem o aviso de não encontrado")
+    if resultado.tag_name.lower() == "button":
+        log("write", f"Nome do navio não encontrado para o IMO {imo_str}. Alerta fechado, pulando este IMO.")
+        try:
+            resultado.click()
+        except WebDriverException as e:
+            log("write", f"Erro ao fechar alerta: {e}")
+        return []
+
+    # 2) Capturar o nome do navio no resultado da pesquisa
+    nome_navio = resultado.text.strip()
+    log("write", f"Nome do Navio capturado: {nome_navio}")
+
+    # 3) Clicar no link do IMO
+    with medir("clique_resultado"):
+        try:
+            imo_link = WebDriverWait(driver, 15).until(
+                EC.element_to_be_clickable((By.XPATH, f"//a[contains(text(),'{imo_str}')]"))
+            )
+        except TimeoutException:
+            raise PaginaIncompleta("link do IMO não apareceu no resultado da busca")
+        clicar(driver, imo_link)
+
+    # 4) Esperar a página do navio e abrir o quadro com as empresas
+    with medir("pagina_detalhe"):
+        try:
+            segundo_elemento = WebDriverWait(driver, TEMPO_ESPERA).until(
+                EC.element_to_be_clickable((By.XPATH, XPATH_DETALHE))
+            )
+        except TimeoutException:
+            raise PaginaIncompleta("quadro de empresas não encontrado/clicável na página do navio")
+        clicar(driver, segundo_elemento)
+        try:
+            tabela_body = WebDriverWait(driver, TEMPO_ESPERA).until(
+                EC.visibility_of_element_located((By.XPATH, XPATH_TABELA))
+            )
+        except TimeoutException:
+            raise PaginaIncompleta("tabela de empresas não ficou visível")
+
+    # --- Extração da tabela (Manager, Owner e 'Compania') ---
+    dados = []
+    with medir("leitura_tabela"):
+        for linha in tabela_body.find_elements(By.TAG_NAME, "tr"):
+            celulas = linha.find_elements(By.TAG_NAME, "td")
+            if len(celulas) >= 3:
+                manager, owner = split_manager_owner(celulas[1].text.strip())
+                dados.append({
+                    "IMO": imo_str,
+                    "Nome do Navio": nome_navio,
+                    "Compania": celulas[2].text.strip(),
+                    "Manager": manager,
+                    "Owner": owner
+                })
+    return dados
+
+def trabalhar_sessao(numero, fila, concluir, log, medir=no_timer):
+    """
+    Uma sessão do pool: abre um navegador, faz login e consome IMOs da fila compartilhada
+    até ela esvaziar. Se o navegador cair, abre outro e devolve o IMO à fila (até TENTATIVAS_IMO vezes);
+    se só a página do IMO não carregar (PaginaIncompleta), devolve o IMO à fila sem reiniciar o navegador.
+    Cada IMO terminado é entregue a `concluir(imo, linhas)`; os que falharam, com falhou=True.
+    """
+    def log_sessao(nivel, texto):
+        log(nivel, f"[sessão {numero}] {texto}")
+
+    driver = None
+    try:
+        while True:
+            try:
+                imo_str, tentativa = fila.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if driver is None:
+                    driver = iniciar_driver(log_sessao)
+                    if driver is None:
+                        fila.put((imo_str, tentativa))  # Outra sessão pode processar este IMO
+                        return
+                    fazer_login(driver, medir)
+                log_sessao("write", f"Processando IMO: {imo_str}")
+                with trace("equasis_imo", imo=imo_str, motor="selenium", tentativa=tentativa):
+                    linhas = extrair_imo(driver, imo_str, log_sessao, medir)
+                concluir(imo_str, linhas)
+            except PaginaIncompleta as e:
+                if tentativa < TENTATIVAS_IMO:
+                    log_sessao("write", f"IMO {imo_str}: {e} (tentativa {tentativa}). Será tentado de novo.")
+                    fila.put((imo_str, tentativa + 1))
+                else:
+                    log_sessao("error", f"[ERRO] IMO {imo_str} não processado após {tentativa} tentativas: {e}.")
+                    concluir(imo_str, [], falhou=True)
+            except WebDriverException as e:
+                log_sessao("warning", f"Falha no navegador ao processar o IMO {imo_str} (tentativa {tentativa}): {e.msg or e}")
+                if driver is not None:
+                    try:
+                        driver.quit()
+                    except Exception:
+                        pass
+                driver = None
+                if tentativa < TENTATIVAS_IMO:
+                    fila.put((imo_str, tentativa + 1))
+                else:
+                    log_sessao("error", f"[ERRO] IMO {imo_str} não processado após {tentativa} tentativas.")
+                    concluir(imo_str, [], falhou=True)
+            except Exception as e:
+                log_sessao("write", f"[ERRO] Problema ao processar o IMO {imo_str}: {e}")
+                traceback.print_exc()
+                concluir(imo_str, [], falhou=True)
+    finally:
+        if driver is not None:
+            driver.quit()
+
+def trabalhar_http(numero, fila, concluir, log, medir, motor_http, fila_navegador):
+    """
+    Uma thread do motor HTTP: consome IMOs da fila usando a sessão HTTP compartilhada.
+    IMOs cujas páginas não forem reconhecidas vão para `fila_navegador`, para a extração com Selenium.
+    """
+    while True:
+        try:
+            imo_str, tentativa = fila.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            with trace("equasis_imo", imo=imo_str, motor="http", tentativa=tentativa):
+                linhas = motor_http.fetch(imo_str, medir)
+        except UnrecognizedPage as e:
+            log("write", f"[http {numero}] IMO {imo_str}: {e}. Será extraído pelo navegador.")
+            fila_navegador.put((imo_str, 1))
+            continue
+        except requests.RequestException as e:
+            if tentativa < TENTATIVAS_IMO:
+                fila.put((imo_str, tentativa + 1))
+            else:
+                log("write", f"[http {numero}] IMO {imo_str}: {e}. Será extraído pelo navegador.")
+                fila_navegador.put((imo_str, 1))
+            continue
+        except Exception as e:
+            # Erro inesperado neste IMO: não derruba a thread, o navegador tenta de novo
+            log("warning", f"[http {numero}] IMO {imo_str}: erro inesperado ({type(e).__name__}: {e}). Será extraído pelo navegador.")
+            traceback.print_exc()
+            fila_navegador.put((imo_str, 1))
+            continue
+        concluir(imo_str, linhas)
+        log("write", f"[http {numero}] IMO {imo_str}: {len(linhas)} linha(s)" if linhas else f"[http {numero}] IMO {imo_str} não encontrado.")
+
+def montar_resultado(imos, resultados):
+    """
+    Junta as linhas extraídas na ordem da planilha (IMOs ainda não extraídos ficam de fora).
+    """
+    return pd.DataFrame(
+        [linha for imo_str in imos if imo_str in resultados for linha in resultados[imo_str]], columns=COLUMNS
+    )
+
+def botoes_download(local, csv, xlsx, rotulo, chave, nome="resultado"):
+    """
+    Botões para baixar o resultado em CSV e em Excel. Não reiniciam a página ao serem clicados,
+    então podem ser usados com a extração em andamento.
+    """
+    coluna_csv, coluna_xlsx = local.container().columns(2)
+    coluna_csv.download_button(f"{rotulo} (CSV)", csv, file_name=f"{nome}.csv", mime="text/csv",
+                               on_click="ignore", key=f"{chave}_csv")
+    coluna_xlsx.download_button(f"{rotulo} (Excel)", xlsx, file_name=f"{nome}.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                on_click="ignore", key=f"{chave}_xlsx")
+
+def botao_parcial(local, imos, resultados, chave):
+    """
+    Download do que já foi extraído para a planilha (ex.: de uma extração interrompida, a partir do cache).
+    """
+    df_parcial = montar_resultado(imos, resultados)
+    botoes_download(local, df_parcial.to_csv(index=False).encode("utf-8"), rows_to_xlsx(df_parcial.values.tolist()),
+                    f"Baixar resultados parciais ({len(resultados)} de {len(set(imos))} IMOs)", chave,
+                    nome="resultado_parcial")
+
+def processar_imos(df_imos, sessoes=SESSOES, cache=None, reaproveitar=True, motor=MOTOR):
+    """
+    Extrai os dados de todos os IMOs da planilha, divididos entre `sessoes` sessões paralelas.
+    Com motor="http", as páginas são lidas sem navegador e só os IMOs com páginas não reconhecidas
+    passam pelo pool de navegadores logados; com motor="selenium", todos passam.
+    As mensagens das sessões são mostradas pela thread do Streamlit.
+    Com `cache`, cada IMO concluído é gravado na hora e, com `reaproveitar`, IMOs extraídos
+    recentemente não são buscados de novo: uma extração interrompida continua de onde parou.
+    As linhas também são acrescentadas a um CSV em disco assim que cada IMO termina (baixável em
+    CSV ou Excel durante a extração), e o tempo de cada etapa aparece em um resumo ao vivo.
+    """
+    imos = [str(imo).strip() for imo in df_imos["IMO"]]
+    if not imos:
+        return pd.DataFrame()
+    if cache is not None:
+        cache.purge_expired()  # Sem isso os registros vencidos se acumulam no arquivo
+    resultados = cache.get_many(imos) if cache is not None and reaproveitar else {}
+    pendentes = [imo_str for imo_str in dict.fromkeys(imos) if imo_str not in resultados]
+    if resultados:
+        st.info(f"{len(resultados)} IMO(s) extraídos recentemente foram reaproveitados do cache.")
+    fila = queue.Queue()
+    for imo_str in pendentes:
+        fila.put((imo_str, 1))
+    if not pendentes:
+        return montar_resultado(imos, resultados)
+
+    arquivo = IncrementalExport()
+    arquivo.add(montar_resultado(imos, resultados).to_dict("records"))
+    st.caption(f"Resultados gravados à medida que cada IMO termina em {arquivo.path}")
+    tempos = TemposEtapas()
+    eventos = queue.Queue()
+    total = len(set(imos))
+    progresso = st.progress(len(resultados) / total)
+    parcial = st.empty()
+    painel_tempos = st.empty()
+    estado = {"atualizado": 0.0, "intervalo": 10.0, "concluidos": len(resultados), "tempos": 0.0}
+
+    def log(nivel, texto):
+        eventos.put((nivel, texto))
+
+    def concluir(imo_str, linhas, falhou=False):
+        # Chamado pelas sessões assim que cada IMO termina: checkpoint no cache e linhas no arquivo exportado.
+        # IMOs que falharam não vão para o cache, para serem tentados de novo na próxima extração.
+        if cache is not None and not falhou:
+            cache.put(imo_str, linhas)
+        arquivo.add(linhas)
+        resultados[imo_str] = linhas
+
+    def executar(trabalhador, quantidade, *args):
+        # Roda `quantidade` trabalhadores e, enquanto isso, mostra mensagens, progresso, tempos e os downloads parciais
+        with ThreadPoolExecutor(max_workers=quantidade, thread_name_prefix="equasis") as executor:
+            futuros = [executor.submit(trabalhador, numero, *args) for numero in range(1, quantidade + 1)]
+            while not all(f.done() for f in futuros) or not eventos.empty():
+                try:
+                    nivel, texto = eventos.get(timeout=0.2)
+                    log_streamlit(nivel, texto)
+                except queue.Empty:
+                    pass
+                progresso.progress(len(resultados) / total, text=f"{len(resultados)} de {total} IMOs")
+                if time.monotonic() - estado["tempos"] > 1:
+                    estado["tempos"] = time.monotonic()
+                    painel_tempos.dataframe(tempos.resumo(), hide_index=True)
+                if len(resultados) > estado["concluidos"] and time.monotonic() - estado["atualizado"] > estado["intervalo"]:
+                    # O st.download_button desta versão precisa dos bytes prontos; para que gerar os arquivos
+                    # não pese em extrações longas, o intervalo cresce com o custo da última geração (~5% do tempo)
+                    inicio = time.monotonic()
+                    estado["concluidos"] = len(resultados)
+                    botoes_download(parcial, arquivo.csv_bytes(), arquivo.xlsx_bytes(),
+                                    f"Baixar resultados parciais ({len(resultados)} de {total} IMOs)",
+                                    f"parcial_{estado['concluidos']}", nome="resultado_parcial")
+                    estado["atualizado"] = time.monotonic()
+                    estado["intervalo"] = max(10.0, 20 * (estado["atualizado"] - inicio))
+            for f in futuros:
+                f.result()  # Um trabalhador que terminou com exceção não passa em silêncio
+
+    try:
+        if motor == "http":
+            fila_navegador = queue.Queue()
+            motor_http = EquasisHttp(EQUASIS_URL, EQUASIS_EMAIL, EQUASIS_PASSWORD, connections=sessoes)
+            try:
+                motor_http.login(tempos.medir)
+            except (UnrecognizedPage, requests.RequestException) as e:
+                st.warning(f"Login sem navegador falhou ({e}). Usando o navegador para todos os IMOs.")
+            else:
+                executar(trabalhar_http, max(1, min(sessoes, len(pendentes))), fila, concluir, log, tempos.medir,
+                         motor_http, fila_navegador)
+                fila = fila_navegador
+                if not fila.empty():
+                    st.info(f"{fila.qsize()} IMO(s) com páginas não reconhecidas serão extraídos pelo navegador.")
+
+        if not fila.empty():
+            executar(trabalhar_sessao, max(1, min(sessoes, fila.qsize())), fila, concluir, log, tempos.medir)
+            st.write("Navegadores fechados.")
+    finally:
+        arquivo.close()
+        parcial.empty()
+        painel_tempos.dataframe(tempos.resumo(), hide_index=True)
+
+    if not fila.empty():
+        mensagem = f"{fila.qsize()} IMO(s) não processados: nenhum navegador disponível."
+        st.error("Não foi possível iniciar o WebDriver. " + mensagem if len(resultados) == 0 else mensagem)
+    if not resultados:
+        return None
+    df_resultado = montar_resultado(imos, resultados)
+    return df_resultado
+
+# --- Interface do Streamlit ---
+st.title("Scraping de Dados - Equasis")
+
+df_imos = None
+uploaded_file = st.file_uploader("Selecione o arquivo Excel com a lista de IMOs", type=["xlsx", "xls"])
+if uploaded_file is not None:
+    try:
+        df_imos = pd.read_excel(BytesIO(uploaded_file.read()))
+        st.write("Arquivo carregado com sucesso!")
+        st.write(df_imos.head())
+    except Exception as e:
+        st.error("Erro ao ler o arquivo: " + str(e))
+
+motor = st.radio("Motor de extração", list(MOTORES), index=list(MOTORES).index(MOTOR), format_func=MOTORES.get, horizontal=True)
+sessoes = st.number_input("Sessões em paralelo", min_value=1, max_value=10, value=SESSOES)
+usar_cache = st.checkbox("Reaproveitar IMOs extraídos recentemente", value=True)
+cache_imos = get_cache_imos()
+
+if df_imos is not None and "IMO" in df_imos:
+    # Resultado de uma extração anterior (inclusive interrompida) para esta planilha
+    imos_planilha = [str(imo).strip() for imo in df_imos["IMO"]]
+    ja_extraidos = cache_imos.get_many(imos_planilha)
+    if ja_extraidos:
+        botao_parcial(st, imos_planilha, ja_extraidos, "parcial_cache")
+
+if st.button("Iniciar Extração"):
+    if df_imos is None:
+        st.error("Por favor, faça o upload do arquivo Excel primeiro.")
+    elif not EQUASIS_PASSWORD:
+        st.error("Defina a senha do Equasis na variável de ambiente EQUASIS_PASSWORD.")
+    else:
+        with st.spinner("Processando..."):
+            df_resultado = processar_imos(df_imos, int(sessoes), cache_imos, reaproveitar=usar_cache, motor=motor)
+            if df_resultado is not None and not df_resultado.empty:
+                st.success("Processo concluído!")
+                st.dataframe(df_resultado)
+                botoes_download(st, df_resultado.to_csv(index=False).encode("utf-8"),
+                                rows_to_xlsx(df_resultado.values.tolist()), "Baixar resultado", "resultado")
+            else:
+                st.warning("Nenhum dado foi extraído.")
@@ -0,0 +1,133 @@
+"""
+Busca lexical (BM25) sobre o catálogo e combinação com a busca vetorial.
+A busca lexical roda localmente, sem embeddings, e acerta códigos, medidas e termos exatos
+("BRISTLE", "PC", "168X44MM") que a busca vetorial costuma perder.
+"""
+import os
+import re
+import math
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+# Colunas do catálogo indexadas pela busca lexical
+LEXICAL_FIELDS = ("CODIGO IMPA", "DESCRIÇÃO EM PORTUGUÊS", "DESCRIÇÃO EM INGLÊS")
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")  # "rrf" (reciprocal rank fusion) ou "ponderada"
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", 0.5))  # Peso da busca lexical na fusão ponderada
+RRF_K = 60
+# A busca vetorial é dispensada quando o 1º resultado lexical tem pontuação pelo menos
+# esta quantidade de vezes maior que o 2º (0 desativa)
+LEXICAL_CONFIDENCE_RATIO = float(os.getenv("LEXICAL_CONFIDENCE_RATIO", 2.0))
+
+def tokenize(text: str) -> list:
+    """Minúsculas, sem acentos, separando letras/números ('168X44MM' -> ['168x44mm', '168', 'x', '44', 'mm'])."""
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        tokens.append(word)
+        parts = re.findall(r"[a-z]+|[0-9]+", word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+def _field_text(page_content: str, fields) -> str:
+    values = []
+    for line in page_content.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip() in fields:
+            values.append(value)
+    return " ".join(values) if values else page_content
+
+class LexicalIndex:
+    """
+    Índice invertido BM25. Os pesos de cada ocorrência são calculados na construção,
+    então uma consulta só soma vetores numpy das listas dos termos buscados.
+    """
+
+    def __init__(self, documents: list, fields=LEXICAL_FIELDS, k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        postings = defaultdict(dict)
+        lengths = np.zeros(len(documents), dtype="float32")
+        self.codes = {}
+        for position, doc in enumerate(documents):
+            tokens = tokenize(_field_text(doc.page_content, fields))
+            lengths[position] = len(tokens)
+            for token in tokens:
+                postings[token][position] = postings[token].get(position, 0) + 1
+            for line in doc.page_content.splitlines():
+                key, _, value = line.partition(":")
+                if key.strip() == fields[0] and value.strip():
+                    self.codes.setdefault(value.strip(), position)
+
+        average_length = float(lengths.mean()) if len(documents) else 0.0
+        self._postings = {}
+        for token, frequencies in postings.items():
+            ids = np.fromiter(frequencies.keys(), dtype="int32", count=len(frequencies))
+            tf = np.fromiter(frequencies.values(), dtype="float32", count=len(frequencies))
+            idf = math.log(1 + (len(documents) - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = k1 * (1 - b + b * lengths[ids] / (average_length or 1.0))
+            self._postings[token] = (ids, (idf * tf * (k1 + 1) / (tf + norm)).astype("float32"))
+
+    def search(self, query: str, k: int = 3) -> list:
+        """Retorna até k pares (posição do documento, pontuação), do mais relevante ao menos relevante."""
+        scores = np.zeros(len(self.documents), dtype="float32")
+        for token in set(tokenize(query)):
+            if token in self._postings:
+                ids, weights = self._postings[token]
+                scores[ids] += weights
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(position), float(scores[position])) for position in top if scores[position] > 0]
+
+    def exact_code(self, query: str):
+        """Posição do documento cujo código IMPA aparece na consulta (ex.: 'o que é IMPA 110911'), ou None."""
+        for token in re.findall(r"\d{6}", query):
+            if token in self.codes:
+                return self.codes[token]
+        return None
+
+def hybrid_search(lexical: LexicalIndex, vectorstore, query: str, k: int = 3,
+                  fusion: str = HYBRID_FUSION, lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+                  confidence_ratio: float = LEXICAL_CONFIDENCE_RATIO) -> list:
+    """
+    Combina a busca lexical com a busca vetorial e retorna os k documentos mais relevantes.
+    Quando a consulta traz um código do catálogo, ou o melhor resultado lexical se destaca
+    claramente, a busca vetorial (que exige gerar o embedding da consulta) não é feita.
+    """
+    code_position = lexical.exact_code(query)
+    lexical_results = lexical.search(query, k * 2)
+    if code_position is not None:
+        positions = [code_position] + [p for p, _ in lexical_results if p != code_position]
+        return [lexical.documents[p] for p in positions[:k]]
+    if (
+        confidence_ratio > 0
+        and lexical_results
+        and (len(lexical_results) == 1 or lexical_results[0][1] >= confidence_ratio * lexical_results[1][1])
+    ):
+        return [lexical.documents[p] for p, _ in lexical_results[:k]]
+
+    vector_results = vectorstore.similarity_search_with_score(query, k=k * 2)
+    fused, documents = defaultdict(float), {}
+    if fusion == "ponderada":
+        top_score = lexical_results[0][1] if lexical_results else 1.0
+        for position, score in lexical_results:
+            doc = lexical.documents[position]
+            documents[doc.page_content] = doc
+            fused[doc.page_content] += lexical_weight * score / top_score
+        for doc, distance in vector_results:
+            documents.setdefault(doc.page_content, doc)
+            fused[doc.page_content] += (1 - lexical_weight) / (1 + float(distance))
+    else:
+        for rank, (position, _) in enumerate(lexical_results):
+            doc = lexical.documents[position]
+            documents[doc.page_content] = doc
+            fused[doc.page_content] += 1 / (RRF_K + rank + 1)
+        for rank, (doc, _) in enumerate(vector_results):
+            documents.setdefault(doc.page_content, doc)
+            fused[doc.page_content] += 1 / (RRF_K + rank + 1)
+    ranking = sorted(fused, key=fused.get, reverse=True)
+    return [documents[content] for content in ranking[:k]]
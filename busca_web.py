@@ -0,0 +1,297 @@
+"""
+Busca na web usada pelo chat quando o catálogo não traz contexto para a pergunta.
+A busca e a leitura das páginas rodam de forma assíncrona dentro de um orçamento de tempo fixo:
+o que não terminar no prazo é descartado, então a resposta do chat nunca espera mais que isso.
+Cada página lida é resumida (trechos mais ligados à pergunta) em vez de passar só a URL ao modelo,
+e os resultados ficam em cache por um tempo (TTL) para perguntas repetidas.
+
+Provedores (WEB_SEARCH_PROVIDER):
+    google  - googlesearch-python
+    stub    - resultados locais e determinísticos, para testes sem rede (WEB_STUB_FILE, WEB_STUB_LATENCY)
+    nenhum  - desativa a busca
+Outros provedores podem ser incluídos com register_provider.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+from html.parser import HTMLParser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from busca_lexical import tokenize
+from cache_respostas import normalize_question
+from metricas import record, span
+
+WEB_SEARCH_PROVIDER = os.getenv("WEB_SEARCH_PROVIDER", "google")
+WEB_SEARCH_BUDGET = float(os.getenv("WEB_SEARCH_BUDGET", 4.0))  # Segundos para a busca e a leitura das páginas
+WEB_SEARCH_RESULTS = int(os.getenv("WEB_SEARCH_RESULTS", 3))
+WEB_FETCH_PAGES = os.getenv("WEB_FETCH_PAGES", "1") != "0"  # Lê e resume as páginas encontradas
+WEB_SUMMARY_CHARS = int(os.getenv("WEB_SUMMARY_CHARS", 600))  # Tamanho máximo do resumo de cada página
+WEB_PAGE_MAX_BYTES = 512 * 1024
+WEB_SEARCH_CACHE_TTL = int(os.getenv("WEB_SEARCH_CACHE_TTL", 3600))  # Segundos
+# Buscas sem resultado (ou que estouraram o prazo) ficam em cache por menos tempo
+WEB_SEARCH_NEGATIVE_TTL = int(os.getenv("WEB_SEARCH_NEGATIVE_TTL", 60))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", 500))
+WEB_STUB_FILE = os.getenv("WEB_STUB_FILE", "")  # JSON {pergunta: [{url, titulo, trecho, texto}]}
+WEB_STUB_LATENCY = float(os.getenv("WEB_STUB_LATENCY", 0))  # Atraso simulado do provedor stub, em segundos
+
+# As chamadas bloqueantes (googlesearch) rodam neste pool, e não no executor padrão do asyncio:
+# asyncio.run espera o executor padrão terminar, o que furaria o orçamento de tempo
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="busca-web")
+
+# ------------------------ PROVEDORES ------------------------
+# Um provedor é uma corrotina (pergunta, quantidade, timeout) -> lista de dicionários com
+# "url", "titulo" e "trecho"; "texto" é opcional e, se vier preenchido, a página não é baixada.
+PROVIDERS = {}
+
+def register_provider(name: str, provider):
+    PROVIDERS[name] = provider
+
+async def _google_provider(query: str, num: int, timeout: float) -> list:
+    def run():
+        from googlesearch import search  # pip install googlesearch-python
+
+        results = []
+        for item in search(query, num_results=num, advanced=True, timeout=max(1, int(timeout))):
+            results.append({"url": item.url, "titulo": item.title or "", "trecho": item.description or ""})
+            if len(results) >= num:
+                break
+        return results
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, run)
+
+def _load_stub_results() -> dict:
+    if not WEB_STUB_FILE:
+        return {}
+    with open(WEB_STUB_FILE, encoding="utf-8") as f:
+        return {normalize_question(question): results for question, results in json.load(f).items()}
+
+async def _stub_provider(query: str, num: int, timeout: float) -> list:
+    await asyncio.sleep(WEB_STUB_LATENCY)
+    results = _load_stub_results().get(normalize_question(query))
+    if results is None:
+        slug = "-".join(tokenize(query)[:6]) or "consulta"
+        results = [
+            {
+                "url": f"https://stub.local/{slug}/{position}",
+                "titulo": f"Resultado {position} para {query}",
+                "trecho": f"Trecho de exemplo sobre {query}.",
+                "texto": f"Página de exemplo {position}. Este texto fala sobre {query}. Conteúdo sem relação com a pergunta.",
+            }
+            for position in range(1, num + 1)
+        ]
+    return results[:num]
+
+async def _no_provider(query: str, num: int, timeout: float) -> list:
+    return []
+
+register_provider("google", _google_provider)
+register_provider("stub", _stub_provider)
+register_provider("nenhum", _no_provider)
+
+# ------------------------ LEITURA E RESUMO DAS PÁGINAS ------------------------
+class _TextExtractor(HTMLParser):
+    """Extrai o texto visível de uma página HTML (sem scripts, estilos e menus)."""
+
+    SKIPPED_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "svg", "form"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping and data.strip():
+            self.parts.append(data.strip())
+
+def html_to_text(html: str) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    return " ".join(" ".join(extractor.parts).split())
+
+def summarize(text: str, query: str, max_chars: int = WEB_SUMMARY_CHARS) -> str:
+    """
+    Resumo extrativo: escolhe as frases com mais termos da pergunta e as devolve
+    na ordem original, até max_chars caracteres.
+    """
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(s.strip()) > 20]
+    if not sentences:
+        return text[:max_chars]
+    query_tokens = set(tokenize(query))
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: len(query_tokens.intersection(tokenize(sentences[i]))),
+        reverse=True,
+    )
+    chosen, size = [], 0
+    for i in ranked:
+        if size + len(sentences[i]) > max_chars and chosen:
+            continue
+        chosen.append(i)
+        size += len(sentences[i]) + 1
+        if size >= max_chars:
+            break
+    return " ".join(sentences[i] for i in sorted(chosen))[:max_chars]
+
+async def _fetch_page(session, url: str) -> str:
+    async with session.get(url, headers={"User-Agent": "Mozilla/5.0"}) as response:
+        if response.status != 200 or "html" not in response.headers.get("Content-Type", ""):
+            return ""
+        body = await response.content.read(WEB_PAGE_MAX_BYTES)
+        return html_to_text(body.decode(response.charset or "utf-8", errors="ignore"))
+
+# ------------------------ BUSCA COM ORÇAMENTO DE TEMPO E CACHE ------------------------
+class WebSearch:
+    """
+    Busca na web com prazo máximo e cache em memória (TTL e descarte do menos usado).
+    search() é síncrona, para ser chamada direto do Streamlit; search_async() pode ser usada
+    dentro de um loop asyncio.
+    """
+
+    def __init__(self, provider: str = WEB_SEARCH_PROVIDER, budget: float = WEB_SEARCH_BUDGET,
+                 num_results: int = WEB_SEARCH_RESULTS, fetch_pages: bool = WEB_FETCH_PAGES,
+                 ttl: int = WEB_SEARCH_CACHE_TTL, negative_ttl: int = WEB_SEARCH_NEGATIVE_TTL,
+                 max_entries: int = WEB_SEARCH_CACHE_MAX_ENTRIES):
+        if provider not in PROVIDERS:
+            raise ValueError(f"Provedor de busca desconhecido: {provider} (disponíveis: {', '.join(PROVIDERS)})")
+        self.provider = provider
+        self.budget = budget
+        self.num_results = num_results
+        self.fetch_pages = fetch_pages
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._entries = OrderedDict()  # pergunta normalizada -> entrada
+        self._lock = threading.Lock()
+
+    def _cached(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now > entry["expira"]:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["resultados"]
+
+    def _store(self, key: str, results: list, complete: bool):
+        ttl = self.ttl if results and complete else self.negative_ttl
+        with self._lock:
+            self._entries[key] = {"resultados": results, "expira": time.time() + ttl}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def _search(self, query: str, timings: dict) -> tuple:
+        """Retorna (resultados, completo). completo=False quando algo estourou o prazo ou falhou."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget
+        try:
+            results = await asyncio.wait_for(
+                PROVIDERS[self.provider](query, self.num_results, self.budget), timeout=self.budget
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            timings["esgotado"] = True
+            return [], False
+        except Exception as error:
+            self.errors += 1
+            timings["erro"] = f"{type(error).__name__}: {error}"[:300]
+            # Registrado como etapa com erro, para aparecer na página de métricas (metricas_admin.py)
+            record("busca_web_provedor", self.budget - (deadline - loop.time()), "erro",
+                   provedor=self.provider, erro=timings["erro"])
+            return [], False
+        timings["busca"] = self.budget - (deadline - loop.time())
+
+        pages = {}
+        to_fetch = [r["url"] for r in results if not r.get("texto")] if self.fetch_pages else []
+        complete = True
+        if to_fetch and deadline - loop.time() > 0:
+            import aiohttp
+
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=deadline - loop.time())) as session:
+                tasks = {asyncio.ensure_future(_fetch_page(session, url)): url for url in to_fetch}
+                done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()))
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        pages[tasks[task]] = task.result()
+                if pending:
+                    self.timeouts += 1
+                    timings["esgotado"] = True
+                    complete = False
+
+        summarized = []
+        for result in results:
+            text = result.get("texto") or pages.get(result["url"]) or result.get("trecho", "")
+            summarized.append({
+                "url": result["url"],
+                "titulo": result.get("titulo", ""),
+                "resumo": summarize(text, query) if text else "",
+            })
+        return summarized, complete
+
+    async def search_async(self, query: str, timings: dict = None) -> list:
+        """
+        Busca a pergunta e retorna uma lista de {"url", "titulo", "resumo"}, em até `budget` segundos.
+        Se `timings` for informado, recebe "total", "origem" ("cache" ou o provedor) e, quando for o caso,
+        "busca", "esgotado" e "erro".
+        """
+        timings = timings if timings is not None else {}
+        start = time.perf_counter()
+        key = normalize_question(query)
+        results = self._cached(key)
+        if results is not None:
+            timings.update(origem="cache", total=time.perf_counter() - start)
+            return results
+        results, complete = await self._search(query, timings)
+        self._store(key, results, complete)
+        timings.update(origem=self.provider, total=time.perf_counter() - start)
+        return results
+
+    def search(self, query: str, timings: dict = None) -> list:
+        timings = timings if timings is not None else {}
+        with span("busca_web", provedor=self.provider) as attrs:
+            results = asyncio.run(self.search_async(query, timings))
+            attrs.update(
+                resultados=len(results), cache="acerto" if timings.get("origem") == "cache" else "falha",
+                esgotado=bool(timings.get("esgotado")),
+            )
+            if "erro" in timings:
+                attrs["erro"] = timings["erro"]
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "acertos": self.hits,
+                "falhas": self.misses,
+                "tempo_esgotado": self.timeouts,
+                "erros": self.errors,
+                "entradas": len(self._entries),
+            }
+
+def format_results(results: list) -> str:
+    """Texto dos resultados para o prompt: título, URL e resumo de cada página."""
+    return "\n\n".join(
+        f"{result['titulo']} ({result['url']})\n{result['resumo']}".strip() for result in results
+    )
@@ -0,0 +1,135 @@
+"""
+Cache persistente de embeddings, usado tanto na indexação do catálogo quanto nas consultas.
+Os vetores ficam em um arquivo SQLite como float32 (binário), com chave (modelo, texto normalizado)
+e descarte dos menos usados quando o limite de entradas é atingido.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from metricas import span
+
+CACHE_FILE = "embeddings_cache.sqlite"
+MAX_ENTRIES = int(os.getenv("EMBEDDINGS_CACHE_MAX_ENTRIES", 200_000))
+
+def normalize_text(text: str) -> str:
+    """Remove espaços repetidos e nas pontas (o catálogo tem muito preenchimento em branco)."""
+    return " ".join(text.split())
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envolve um objeto de embeddings e guarda cada vetor gerado em disco.
+    Expõe o mesmo atributo `model` do objeto envolvido, para que o manifesto do índice não mude.
+    """
+
+    def __init__(self, underlying: Embeddings, path: str = CACHE_FILE, max_entries: int = MAX_ENTRIES):
+        self.underlying = underlying
+        self.model = getattr(underlying, "model", None) or type(underlying).__name__
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_many(self, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):  # Limite de parâmetros por consulta do SQLite
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype="float32").tolist()) for key, vector in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+        return found
+
+    def _put_many(self, items: list):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype="float32").tobytes(), now) for key, vector in items],
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def embed_documents(self, texts: list) -> list:
+        normalized = [normalize_text(text) for text in texts]
+        keys = [self._key(text) for text in normalized]
+        with span("embeddings", textos=len(keys)) as attrs:
+            found = self._get_many(keys)
+
+            missing = {}
+            for key, text in zip(keys, normalized):
+                if key not in found:
+                    missing.setdefault(key, text)
+            hits = len(keys) - sum(1 for key in keys if key not in found)
+            self.hits += hits
+            self.misses += len(missing)
+            attrs.update(acertos=hits, falhas=len(missing))
+            if missing:
+                vectors = self.underlying.embed_documents(list(missing.values()))
+                new_items = list(zip(missing.keys(), vectors))
+                self._put_many(new_items)
+                found.update(new_items)
+        return [list(found[key]) for key in keys]
+
+    def embed_query(self, text: str) -> list:
+        normalized = normalize_text(text)
+        key = self._key(normalized)
+        with span("embeddings", textos=1) as attrs:
+            found = self._get_many([key])
+            if key in found:
+                self.hits += 1
+                attrs.update(acertos=1, falhas=0)
+                return found[key]
+            self.misses += 1
+            attrs.update(acertos=0, falhas=1)
+            vector = self.underlying.embed_query(normalized)
+            self._put_many([(key, vector)])
+            return vector
+
+    def stats(self) -> dict:
+        """Acertos e falhas desde a criação do objeto e o total de entradas em disco."""
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {"acertos": self.hits, "falhas": self.misses, "entradas": count}
+
+def create_embeddings(path: str = CACHE_FILE, provider: str = None) -> CachedEmbeddings:
+    """
+    Cria o objeto de embeddings já com o cache.
+    EMBEDDINGS_PROVIDER=fake usa um embedder local e determinístico (sem chamadas à OpenAI),
+    útil para testes, benchmarks e para rodar sem chave de API (ver modelos_fake.py).
+    """
+    provider = provider or os.getenv("EMBEDDINGS_PROVIDER", "openai")
+    if provider == "fake":
+        from modelos_fake import FakeEmbeddings
+        underlying = FakeEmbeddings()
+    else:
+        from langchain_community.embeddings import OpenAIEmbeddings
+        underlying = OpenAIEmbeddings()
+    return CachedEmbeddings(underlying, path)
@@ -0,0 +1,69 @@
+"""
+Cache persistente das extrações do Equasis (bot.py), por IMO.
+Cada IMO é gravado assim que termina de ser extraído, então o cache também serve de checkpoint:
+uma extração interrompida (erro, queda, novo clique no Streamlit) recomeça só pelos IMOs que faltam.
+Os dados de proprietário e gestor mudam pouco, por isso cada registro vale por IMO_CACHE_TTL;
+IMOs sem resultado valem por menos tempo (IMO_CACHE_NEGATIVE_TTL), para serem conferidos de novo antes.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+IMO_CACHE_FILE = os.getenv("IMO_CACHE_FILE", "imos_cache.sqlite")
+IMO_CACHE_TTL = float(os.getenv("IMO_CACHE_TTL", 7 * 86400))  # Segundos
+IMO_CACHE_NEGATIVE_TTL = float(os.getenv("IMO_CACHE_NEGATIVE_TTL", 86400))
+
+class ImoCache:
+    """
+    Linhas extraídas por IMO em SQLite, com validade por registro.
+    Uma única conexão compartilhada pelas sessões do navegador, protegida por lock.
+    """
+
+    def __init__(self, path: str = IMO_CACHE_FILE, ttl: float = IMO_CACHE_TTL,
+                 negative_ttl: float = IMO_CACHE_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS imos ("
+            "imo TEXT PRIMARY KEY, linhas TEXT NOT NULL, extraido REAL NOT NULL, expira REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, imos: list, now: float = None) -> dict:
+        """Linhas dos IMOs com registro ainda válido ({imo: [linhas]}); os demais ficam de fora."""
+        now = time.time() if now is None else now
+        imos = list(dict.fromkeys(imos))
+        found = {}
+        with self._lock:
+            for start in range(0, len(imos), 500):  # Limite de parâmetros por consulta do SQLite
+                chunk = imos[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT imo, linhas FROM imos WHERE expira > ? AND imo IN ({','.join('?' * len(chunk))})",
+                    [now, *chunk],
+                ).fetchall()
+                found.update((imo, json.loads(linhas)) for imo, linhas in rows)
+        return found
+
+    def put(self, imo: str, linhas: list):
+        """Grava (checkpoint) o resultado de um IMO assim que ele termina."""
+        now = time.time()
+        expira = now + (self.ttl if linhas else self.negative_ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO imos (imo, linhas, extraido, expira) VALUES (?, ?, ?, ?)",
+                (imo, json.dumps(linhas, ensure_ascii=False), now, expira),
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Remove os registros vencidos; retorna quantos foram removidos."""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM imos WHERE expira <= ?", (time.time(),)).rowcount
+            self._conn.commit()
+        return removed
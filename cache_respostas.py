@@ -0,0 +1,88 @@
+"""
+Cache de respostas do chat, compartilhado entre as sessões.
+Uma pergunta é atendida pelo cache quando já foi feita antes (após normalização) ou quando é
+muito parecida com uma pergunta anterior (similaridade de embeddings acima do limite),
+desde que o contexto recuperado do catálogo seja o mesmo.
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 6 * 3600))  # Segundos
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))  # Similaridade de cosseno mínima
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, espaços simples e sem pontuação no fim ('O que é IMPA 110911?' -> 'o que é impa 110911')."""
+    return re.sub(r"[\s?!.]+$", "", " ".join(question.lower().split()))
+
+class AnswerCache:
+    """
+    Cache em memória com expiração (TTL) e descarte do menos usado (LRU).
+    A chave inclui o hash do contexto recuperado: se o catálogo mudar, as respostas antigas
+    deixam de ser encontradas e expiram naturalmente.
+    """
+
+    def __init__(self, embeddings, ttl: int = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.embeddings = embeddings
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (pergunta normalizada, hash do contexto) -> entrada
+        self._lock = threading.Lock()
+
+    def _vector(self, question: str):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype="float32")
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _purge_expired(self, now: float):
+        for key in [key for key, entry in self._entries.items() if now - entry["criado"] > self.ttl]:
+            del self._entries[key]
+
+    def get(self, question: str, context: str):
+        """Retorna a resposta guardada para a pergunta e o contexto, ou None."""
+        key = (normalize_question(question), hashlib.sha1(context.encode("utf-8")).hexdigest())
+        with self._lock:
+            self._purge_expired(time.time())
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]["resposta"]
+            candidates = [(k, entry) for k, entry in self._entries.items() if k[1] == key[1]]
+
+        if candidates:
+            vector = self._vector(question)
+            similarities = np.stack([entry["vetor"] for _, entry in candidates]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                with self._lock:
+                    best_key = candidates[best][0]
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                        self.hits += 1
+                        return self._entries[best_key]["resposta"]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, question: str, context: str, answer: str):
+        """Guarda a resposta, descartando as entradas menos usadas acima do limite."""
+        key = (normalize_question(question), hashlib.sha1(context.encode("utf-8")).hexdigest())
+        entry = {"resposta": answer, "vetor": self._vector(question), "criado": time.time()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"acertos": self.hits, "falhas": self.misses, "entradas": len(self._entries)}
@@ -0,0 +1,211 @@
+"""
+Leitura do catálogo de produtos (merged_data.csv / merged_data.xlsx).
+Os documentos gerados aqui têm o mesmo formato dos produzidos pelo CSVLoader do LangChain
+("coluna: valor" em cada linha), para que o índice possa ser montado a partir de qualquer fonte.
+
+O catálogo é compilado para um arquivo Arrow (merged_data.arrow) com o texto normalizado,
+sem colunas vazias e sem linhas duplicadas, lido com mmap nas próximas inicializações:
+    python catalogo.py merged_data.csv
+"""
+import os
+import csv
+import hashlib
+import operator
+import argparse
+from collections.abc import Sequence
+
+from langchain_core.documents import Document
+
+CODE_COLUMN = "CODIGO IMPA"
+COMPILED_FORMAT_VERSION = "1"
+
+def catalog_hash(path: str) -> str:
+    """Calcula o SHA-256 do arquivo do catálogo, lendo em blocos."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_catalog_rows(path: str) -> list:
+    """Lê as linhas do catálogo (CSV ou Excel) como dicionários de texto."""
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xls"):
+        import pandas as pd
+        df = pd.read_excel(path, dtype=str).fillna("")
+        return df.to_dict(orient="records")
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+def write_catalog_csv(rows: list, path: str):
+    """Grava as linhas do catálogo em CSV (formato lido pelo agente)."""
+    if not rows:
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()), quoting=csv.QUOTE_ALL)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def row_to_document(row: dict, source: str, row_number: int) -> Document:
+    """Converte uma linha do catálogo em Document, no mesmo formato do CSVLoader."""
+    content = "\n".join(
+        f"{key.strip() if key is not None else key}: {value.strip() if isinstance(value, str) else value}"
+        for key, value in row.items()
+    )
+    return Document(page_content=content, metadata={"source": source, "row": row_number})
+
+def normalize_value(value) -> str:
+    """Remove o preenchimento em branco e os espaços repetidos de um valor do catálogo."""
+    return " ".join(str(value).split()) if value is not None else ""
+
+def compiled_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".arrow"
+
+def compile_catalog(path: str, target: str = None) -> dict:
+    """
+    Compila o catálogo: normaliza o texto, remove colunas vazias e linhas duplicadas e grava
+    as colunas em um arquivo Arrow. Retorna um resumo com a redução de tamanho e de tokens.
+    """
+    import pyarrow as pa
+
+    target = target or compiled_path(path)
+    raw_rows = read_catalog_rows(path)
+    columns = list(raw_rows[0].keys()) if raw_rows else []
+    rows = [{column: normalize_value(row.get(column)) for column in columns} for row in raw_rows]
+    kept_columns = [column for column in columns if any(row[column] for row in rows)]
+    unique_rows = list(dict.fromkeys(tuple(row[column] for column in kept_columns) for row in rows))
+
+    table = pa.table(
+        {column: pa.array([row[i] for row in unique_rows], pa.string()) for i, column in enumerate(kept_columns)},
+        metadata={"hash_origem": catalog_hash(path), "versao_formato": COMPILED_FORMAT_VERSION, **_source_stat(path)},
+    )
+    tmp_path = target + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, target)
+
+    before = [row_to_document(row, path, i).page_content for i, row in enumerate(raw_rows)]
+    after = [doc.page_content for doc in load_compiled_documents(target, path)]
+    return {
+        "linhas_origem": len(raw_rows),
+        "linhas": len(unique_rows),
+        "duplicadas_removidas": len(raw_rows) - len(unique_rows),
+        "colunas_removidas": [column for column in columns if column not in kept_columns],
+        "bytes_origem": os.path.getsize(path),
+        "bytes_compilado": os.path.getsize(target),
+        "caracteres_antes": sum(len(text) for text in before),
+        "caracteres_depois": sum(len(text) for text in after),
+        # Estimativa de ~4 caracteres por token; é o texto que vai para os embeddings e para os prompts
+        "tokens_antes": sum(len(text) // 4 + 1 for text in before),
+        "tokens_depois": sum(len(text) // 4 + 1 for text in after),
+    }
+
+class CatalogDocuments(Sequence):
+    """
+    Documentos do catálogo compilado, montados sob demanda a partir das colunas Arrow mapeadas
+    em memória: o catálogo não é convertido inteiro em objetos Python, e cada Document só existe
+    enquanto é usado. A iteração converte as colunas em blocos de `batch_size` linhas.
+    """
+
+    def __init__(self, table, source: str, batch_size: int = 4096):
+        self._table = table
+        self._source = source
+        self._batch_size = batch_size
+
+    def __len__(self):
+        return self._table.num_rows
+
+    def _document(self, row: dict, position: int) -> Document:
+        return row_to_document(row, self._source, position)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        position = operator.index(position)
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("linha fora do catálogo")
+        row = {name: column[position].as_py() for name, column in zip(self._table.column_names, self._table.columns)}
+        return self._document(row, position)
+
+    def __iter__(self):
+        for start in range(0, len(self), self._batch_size):
+            batch = self._table.slice(start, self._batch_size).to_pylist()
+            for offset, row in enumerate(batch):
+                yield self._document(row, start + offset)
+
+def load_compiled_documents(target: str, source: str) -> CatalogDocuments:
+    """Abre o catálogo compilado via mmap (sem cópia dos dados); os Documents são montados sob demanda."""
+    import pyarrow as pa
+
+    # O mapeamento fica aberto enquanto os documentos forem usados (as colunas apontam para ele)
+    return CatalogDocuments(pa.ipc.open_file(pa.memory_map(target, "r")).read_all(), source)
+
+def _source_stat(path: str) -> dict:
+    stat = os.stat(path)
+    return {"mtime_origem": str(stat.st_mtime_ns), "tamanho_origem": str(stat.st_size)}
+
+def _compiled_is_current(target: str, path: str) -> bool:
+    import pyarrow as pa
+
+    try:
+        with pa.memory_map(target, "r") as mapped:
+            metadata = pa.ipc.open_file(mapped).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    if metadata.get(b"versao_formato") != COMPILED_FORMAT_VERSION.encode():
+        return False
+    # Mesma data de modificação e tamanho: o catálogo não mudou e o hash não precisa ser recalculado
+    stat = _source_stat(path)
+    if all(metadata.get(key.encode()) == value.encode() for key, value in stat.items()):
+        return True
+    return metadata.get(b"hash_origem") == catalog_hash(path).encode()
+
+def load_catalog_documents(path: str) -> CatalogDocuments:
+    """
+    Retorna os Documents do catálogo (um por linha), a partir da versão compilada.
+    Se ela não existir ou tiver sido gerada de outra versão do catálogo, é recompilada.
+    """
+    target = compiled_path(path)
+    if not _compiled_is_current(target, path):
+        compile_catalog(path, target)
+    return load_compiled_documents(target, path)
+
+def document_code(doc: Document) -> str:
+    """Retorna o código IMPA de um documento do catálogo (ou string vazia)."""
+    for line in doc.page_content.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip() == CODE_COLUMN:
+            return value.strip()
+    return ""
+
+def document_keys(documents: list) -> list:
+    """
+    Gera uma chave estável por documento: o código IMPA, com sufixo '#n' quando o código se repete.
+    Linhas sem código usam o hash do próprio conteúdo.
+    """
+    keys, seen = [], {}
+    for doc in documents:
+        key = document_code(doc) or "#" + content_hash(doc.page_content)
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila o catálogo para o formato Arrow normalizado.")
+    parser.add_argument("catalogo", nargs="?", default="merged_data.csv", help="Catálogo em CSV ou Excel.")
+    args = parser.parse_args()
+
+    report = compile_catalog(args.catalogo)
+    print(f"Linhas: {report['linhas_origem']} -> {report['linhas']} ({report['duplicadas_removidas']} duplicadas removidas)")
+    print("Colunas removidas:", ", ".join(report["colunas_removidas"]) or "nenhuma")
+    print(f"Arquivo: {report['bytes_origem']} -> {report['bytes_compilado']} bytes")
+    print(f"Texto dos documentos: {report['caracteres_antes']} -> {report['caracteres_depois']} caracteres")
+    print(f"Tokens (embeddings e prompts): {report['tokens_antes']} -> {report['tokens_depois']}")
+
+if __name__ == "__main__":
+    main()
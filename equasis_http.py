@@ -0,0 +1,161 @@
+"""
+Extração do Equasis sem navegador: login por cookie em uma sessão `requests` (com pool de conexões,
+compartilhada pelas threads) e leitura direta do HTML das páginas de busca e do navio com lxml.
+Produz os mesmos registros (IMO / Nome do Navio / Compania / Manager / Owner) da extração com Selenium
+do bot.py; quando uma página não tem a estrutura esperada, levanta UnrecognizedPage para que o bot
+extraia aquele IMO pelo navegador.
+"""
+import threading
+from contextlib import nullcontext
+from urllib.parse import urljoin
+
+import lxml.etree
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+
+LOGIN_PATH = "/EquasisWeb/authen/HomePage?fs=HomePage"
+SEARCH_PATH = "/EquasisWeb/restricted/Search?fs=HomePage"
+SHIP_PATH = "/EquasisWeb/restricted/ShipInfo?fs=Search"
+
+# Mesmos elementos lidos pelo Selenium, sem depender do <tbody> que o navegador insere
+XPATH_SHIP_NAME = '//*[@id="ShipResultId"]//tr[td][1]/td[1]'
+XPATH_NOT_FOUND = '//*[@id="warning"]'
+XPATH_COMPANY_TABLE = '//*[@id="collapse3"]/div/div/div/div/div/div[1]/div[1]/div[3]/div/div/form/table'
+XPATH_LOGIN_FORM = '//*[@id="home-login"]'
+XPATH_SEARCH_FIELD = '//*[@id="P_ENTREE_HOME"] | //*[@id="P_ENTREE_ENTETE"]'
+
+def no_timer(stage: str):
+    """Medidor padrão das etapas: não mede nada."""
+    return nullcontext()
+
+class UnrecognizedPage(Exception):
+    """A página não tem a estrutura esperada (layout mudou, captcha, erro do site...)."""
+
+class _SessionExpired(Exception):
+    pass
+
+def split_manager_owner(roles_text: str):
+    """
+    Separa o texto da coluna de funções ("ISM Manager", "Registered owner"...) em (manager, owner).
+    """
+    managers, owners = [], []
+    parts = roles_text.split("\n")
+    for part in parts:
+        for sub in (part.split("/") if "/" in part else [part]):
+            sub = sub.strip()
+            if "manager" in sub.lower():
+                managers.append(sub)
+            if "owner" in sub.lower():
+                owners.append(sub)
+    manager, owner = " / ".join(managers), " / ".join(owners)
+    if not manager and not owner and parts:
+        manager = parts[0].strip()
+    return manager, owner
+
+def _document(html: str):
+    try:
+        document = lxml.html.fromstring(html)
+    except (lxml.etree.ParserError, ValueError) as e:  # Corpo vazio ou ilegível
+        raise UnrecognizedPage(f"página vazia ou ilegível ({e})")
+    for br in document.iter("br"):  # Como o .text do Selenium: <br> vira quebra de linha
+        br.tail = "\n" + (br.tail or "")
+    return document
+
+def _text(element) -> str:
+    return "\n".join(line.strip() for line in element.text_content().splitlines() if line.strip())
+
+def parse_search(html: str):
+    """Nome do navio no resultado da busca, ou None se o site avisou que o IMO não foi encontrado."""
+    document = _document(html)
+    names = document.xpath(XPATH_SHIP_NAME)
+    if names:
+        return _text(names[0])
+    if document.xpath(XPATH_NOT_FOUND):
+        return None
+    if document.xpath(XPATH_LOGIN_FORM):
+        raise _SessionExpired()
+    raise UnrecognizedPage("resultado da busca sem a tabela ShipResultId nem o aviso de não encontrado")
+
+def parse_ship(html: str, imo: str, ship_name: str) -> list:
+    """Linhas da tabela de empresas (collapse3) da página do navio."""
+    document = _document(html)
+    tables = document.xpath(XPATH_COMPANY_TABLE)
+    if not tables:
+        if document.xpath(XPATH_LOGIN_FORM):
+            raise _SessionExpired()
+        raise UnrecognizedPage("página do navio sem a tabela de empresas (collapse3)")
+    rows = []
+    for row in tables[0].xpath(".//tr[td]"):
+        cells = row.xpath("./td")
+        if len(cells) >= 3:
+            manager, owner = split_manager_owner(_text(cells[1]))
+            rows.append({
+                "IMO": imo,
+                "Nome do Navio": ship_name,
+                "Compania": _text(cells[2]),
+                "Manager": manager,
+                "Owner": owner,
+            })
+    return rows
+
+class EquasisHttp:
+    """
+    Sessão HTTP logada no Equasis, segura para uso por várias threads ao mesmo tempo.
+    Se o site derrubar a sessão (página de login no lugar do resultado), faz login de novo uma vez.
+    """
+
+    def __init__(self, base_url: str, email: str, password: str, connections: int = 4, timeout: float = 30):
+        self.base_url = base_url
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, connections))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)"
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
+
+    def _post(self, path: str, data: dict) -> str:
+        response = self.session.post(urljoin(self.base_url, path), data=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def login(self, timer=no_timer):
+        """Faz login; levanta UnrecognizedPage se a página seguinte não tiver o campo de busca."""
+        with self._login_lock, timer("login"):
+            html = self._post(LOGIN_PATH, {"j_email": self.email, "j_password": self.password, "submit": "Login"})
+            if not _document(html).xpath(XPATH_SEARCH_FIELD):
+                raise UnrecognizedPage("login sem acesso à busca (credenciais ou página de login mudaram)")
+            self._login_generation += 1
+
+    def _relogin(self, generation: int, timer):
+        with self._login_lock:
+            renewed = self._login_generation != generation  # Outra thread já refez o login
+        if not renewed:
+            self.login(timer)
+
+    def fetch(self, imo: str, timer=no_timer) -> list:
+        """
+        Linhas do IMO ([] se o site não encontrar o navio).
+        `timer(etapa)` mede as etapas: busca, pagina_detalhe (download) e leitura_tabela.
+        """
+        for attempt in range(2):
+            generation = self._login_generation
+            try:
+                with timer("busca"):
+                    ship_name = parse_search(self._post(SEARCH_PATH, {
+                        "P_ENTREE_HOME": imo, "checkbox-shipSearch": "Ship", "Submit": "SEARCH",
+                    }))
+                if ship_name is None:
+                    return []
+                with timer("pagina_detalhe"):
+                    html = self._post(SHIP_PATH, {"P_IMO": imo})
+                with timer("leitura_tabela"):
+                    return parse_ship(html, imo, ship_name)
+            except _SessionExpired:
+                if attempt:
+                    raise UnrecognizedPage("sessão recusada mesmo após novo login")
+                self._relogin(generation, timer)
@@ -0,0 +1,194 @@
+"""
+Imitação local e estática das páginas do Equasis usadas pelo bot.py, para testar a extração
+sem acessar o site (e sem gastar o limite de consultas da conta):
+    python equasis_mock.py --porta 8765 --latencia 0.5
+    EQUASIS_URL=http://localhost:8765/ streamlit run bot.py
+
+As páginas reproduzem os ids e a estrutura dos XPaths lidos pelo bot: login, campo de busca
+(início e cabeçalho), resultado da busca (ShipResultId), alerta de navio não encontrado e a
+tabela de empresas (collapse3). Os navios são gerados a partir do número IMO; IMOs
+terminados em 9 simulam "navio não encontrado".
+"""
+import os
+import time
+import uuid
+import random
+import argparse
+import threading
+from html import escape
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOGIN_PATH = "/EquasisWeb/authen/HomePage"
+SEARCH_PATH = "/EquasisWeb/restricted/Search"
+SHIP_PATH = "/EquasisWeb/restricted/ShipInfo"
+
+ROLES = ("Registered owner", "ISM Manager", "Ship manager/Commercial manager", "Group owner")
+
+def ship_for(imo: str):
+    """Navio fictício e determinístico para o IMO, ou None para simular "não encontrado"."""
+    if not imo.isdigit() or imo.endswith("9"):
+        return None
+    rng = random.Random(int(imo))
+    companies = [
+        {
+            "imo": str(rng.randint(1000000, 9999999)),
+            "role": role,
+            "name": f"{rng.choice(('ATLANTIC', 'OCEANIC', 'SOUTHERN', 'BLUE'))} {rng.choice(('SHIPPING', 'MARINE', 'NAVIGATION'))} {imo[-3:]}",
+            "address": f"Rua {rng.randint(1, 999)}, Santos",
+            "date": f"since {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/20{rng.randint(10, 24)}",
+        }
+        for role in rng.sample(ROLES, rng.randint(2, 4))
+    ]
+    return {"imo": imo, "name": f"NAVIO {imo}", "companies": companies}
+
+def _page(body: str, header_search: bool = True) -> str:
+    header = (
+        f'<form method="post" action="{SEARCH_PATH}?fs=Search"><input type="text" id="P_ENTREE_ENTETE" '
+        'name="P_ENTREE"><input type="hidden" name="checkbox-shipSearch" value="Ship"></form>'
+        if header_search else ""
+    )
+    return f"<!DOCTYPE html><html><head><title>Equasis</title></head><body><header>{header}</header>{body}</body></html>"
+
+def home_page() -> str:
+    return _page(
+        f'<form method="post" action="{LOGIN_PATH}?fs=HomePage">'
+        '<input type="text" id="home-login" name="j_email"><input type="password" id="home-password" name="j_password">'
+        '<input type="submit" name="submit" value="Login"></form>',
+        header_search=False,
+    )
+
+def restricted_home_page() -> str:
+    return _page(
+        f'<form method="post" action="{SEARCH_PATH}?fs=HomePage"><input type="text" id="P_ENTREE_HOME" name="P_ENTREE_HOME">'
+        '<input type="hidden" name="checkbox-shipSearch" value="Ship"></form>',
+        header_search=False,
+    )
+
+def search_page(imo: str) -> str:
+    ship = ship_for(imo)
+    if ship is None:
+        return _page(
+            '<div id="warning" class="modal"><div><div><div class="modal-header">Warning</div>'
+            '<div class="modal-body">No result has been found for your search.</div>'
+            '<div class="modal-footer"><button type="button" onclick="document.getElementById(\'warning\').remove()">Close</button></div>'
+            '</div></div></div>'
+        )
+    return _page(
+        '<div id="ShipResultId"><table><thead><tr><th>Name of ship</th><th>IMO number</th></tr></thead><tbody>'
+        f'<tr><td>{escape(ship["name"])}</td><td><a href="{SHIP_PATH}?fs=Search&amp;P_IMO={imo}">{imo}</a></td></tr>'
+        '</tbody></table></div>'
+    )
+
+def ship_page(imo: str) -> str:
+    ship = ship_for(imo)
+    if ship is None:
+        return _page("<p>Ship not found.</p>")
+    rows = "".join(
+        f'<tr><td>{c["imo"]}</td><td>{escape(c["role"])}</td><td>{escape(c["name"])}</td>'
+        f'<td>{escape(c["address"])}</td><td>{c["date"]}</td></tr>'
+        for c in ship["companies"]
+    )
+    # Mesmo aninhamento dos XPaths usados pelo bot.py (cabeçalho h3 que expande o collapse3 e a tabela)
+    heading = (
+        '<div></div><div><a><div><div><div>' + "<div>" * 6
+        + '<h3 onclick="document.getElementById(\'collapse3\').style.display=\'block\'">Management detail</h3>'
+        + "</div>" * 6 + "</div></div></div></a></div>"
+    )
+    table = (
+        '<div id="collapse3" style="display:none">' + "<div>" * 6
+        + '<div><div></div><div></div><div><div><div><form><table>'
+        '<thead><tr><th>IMO</th><th>Role</th><th>Name of company</th><th>Address</th><th>Date of effect</th></tr></thead>'
+        f'<tbody>{rows}</tbody></table></form></div></div></div></div>' + "</div>" * 6 + "</div>"
+    )
+    return _page(
+        '<div id="body">' + "<div></div>" * 5
+        + "<div>" + "<div>" * 6 + heading + "</div>" * 6 + "</div>"
+        + table + f"<h1>{escape(ship['name'])}</h1></div>"
+    )
+
+class EquasisMock(ThreadingHTTPServer):
+    """Servidor com sessões por cookie; páginas restritas sem login voltam para a página inicial."""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.sessions = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, html: str, cookie: str = None):
+        data = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if cookie:
+            self.send_header("Set-Cookie", f"JSESSIONID={cookie}; Path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _logged_in(self) -> bool:
+        cookies = dict(
+            part.strip().split("=", 1) for part in self.headers.get("Cookie", "").split(";") if "=" in part
+        )
+        return cookies.get("JSESSIONID") in self.server.sessions
+
+    def _handle(self, form: dict):
+        with self.server._lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        path = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(path.query).items()}
+        params.update(form)
+        if path.path == LOGIN_PATH and self.command == "POST":
+            if not params.get("j_email") or not params.get("j_password"):
+                return self._send(home_page())
+            session = uuid.uuid4().hex
+            self.server.sessions.add(session)
+            return self._send(restricted_home_page(), cookie=session)
+        if path.path in (SEARCH_PATH, SHIP_PATH) and not self._logged_in():
+            return self._send(home_page())
+        if path.path == SEARCH_PATH:
+            return self._send(search_page(str(params.get("P_ENTREE_HOME") or params.get("P_ENTREE", "")).strip()))
+        if path.path == SHIP_PATH:
+            return self._send(ship_page(str(params.get("P_IMO", "")).strip()))
+        return self._send(restricted_home_page() if self._logged_in() else home_page())
+
+    def do_GET(self):
+        self._handle({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        self._handle({k: v[0] for k, v in parse_qs(body).items()})
+
+def start(port: int = 0, latency: float = 0.0) -> EquasisMock:
+    """Sobe o servidor em segundo plano (porta 0 = porta livre) e o retorna; use server.url."""
+    server = EquasisMock(("127.0.0.1", port), latency)
+    threading.Thread(target=server.serve_forever, name="equasis-mock", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Imitação local das páginas do Equasis para testar o bot.py.")
+    parser.add_argument("--porta", type=int, default=int(os.getenv("EQUASIS_MOCK_PORT", 8765)))
+    parser.add_argument("--latencia", type=float, default=0.0, help="Atraso de cada página, em segundos.")
+    args = parser.parse_args()
+    server = EquasisMock(("127.0.0.1", args.porta), args.latencia)
+    print(f"Equasis simulado em {server.url} (Ctrl+C para encerrar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
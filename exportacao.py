@@ -0,0 +1,91 @@
+"""
+Exportação incremental da extração do Equasis (bot.py): cada IMO concluído é acrescentado a um CSV
+em disco na hora, então o arquivo está sempre válido e pode ser baixado a qualquer momento, em CSV
+ou convertido para XLSX linha a linha, sem montar a planilha inteira em memória.
+"""
+import os
+import csv
+import glob
+import time
+import threading
+from io import BytesIO, StringIO
+
+from openpyxl import Workbook
+
+COLUMNS = ["IMO", "Nome do Navio", "Compania", "Manager", "Owner"]
+EXPORT_DIR = os.getenv("EQUASIS_EXPORT_DIR", "exportacoes_equasis")
+EXPORT_KEEP = int(os.getenv("EQUASIS_EXPORT_KEEP", 20))  # Arquivos de extrações anteriores mantidos no diretório
+
+def rows_to_xlsx(rows, columns: list = COLUMNS) -> bytes:
+    """Planilha XLSX válida a partir de listas de valores, gravada em modo streaming (write_only)."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Resultado")
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def rotate_exports(directory: str = EXPORT_DIR, keep: int = EXPORT_KEEP) -> list:
+    """Apaga os arquivos de extração mais antigos, mantendo os `keep` mais recentes. Retorna os apagados."""
+    files = sorted(glob.glob(os.path.join(directory, "equasis_*.csv")), key=os.path.getmtime, reverse=True)
+    removed = []
+    for path in files[max(keep, 0):]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError:
+            pass
+    return removed
+
+class IncrementalExport:
+    """
+    CSV de uma extração, gravado à medida que os IMOs terminam (várias threads podem chamar add).
+    As linhas ficam na ordem em que os IMOs foram concluídos. Sem `path`, o arquivo é criado em
+    EXPORT_DIR e os de extrações antigas além de EXPORT_KEEP são apagados.
+    """
+
+    def __init__(self, path: str = None):
+        if path is None:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            rotate_exports(EXPORT_DIR, EXPORT_KEEP - 1)  # Abre espaço para o arquivo desta extração
+            path = os.path.join(EXPORT_DIR, time.strftime("equasis_%Y%m%d_%H%M%S.csv"))
+        self.path = path
+        self.rows = 0
+        self._xlsx = (None, b"")  # (linhas, bytes) do último XLSX gerado
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS, extrasaction="ignore")
+        if is_new:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def add(self, rows: list):
+        with self._lock:
+            self._writer.writerows(rows)
+            self._file.flush()
+            self.rows += len(rows)
+
+    def csv_bytes(self) -> bytes:
+        """Conteúdo atual do CSV (só linhas completas: cada add grava e descarrega IMOs inteiros)."""
+        with self._lock, open(self.path, "rb") as f:
+            return f.read()
+
+    def xlsx_bytes(self) -> bytes:
+        """
+        O CSV atual convertido para XLSX, gravado em modo streaming, sem montar um DataFrame.
+        A conversão é guardada e só é refeita quando chegam linhas novas.
+        """
+        with self._lock, open(self.path, "rb") as f:
+            rows, data = self.rows, f.read()
+        if self._xlsx[0] != rows:
+            reader = csv.reader(StringIO(data.decode("utf-8")))
+            next(reader, None)  # Cabeçalho
+            self._xlsx = (rows, rows_to_xlsx(reader))
+        return self._xlsx[1]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,413 @@
+"""
+Armazenamento versionado do índice vetorial (FAISS) do catálogo.
+
+Estrutura em disco:
+    faiss_index/manifest.json      -> versão ativa, hash do catálogo e modelo de embeddings
+    faiss_index/<versao>/index.faiss        -> índice nativo do FAISS (lido com mmap)
+    faiss_index/<versao>/docstore.jsonl     -> documentos, um JSON por linha
+    faiss_index/<versao>/docstore_ids.npy   -> ids do FAISS, em ordem crescente
+    faiss_index/<versao>/docstore_offsets.npy -> posição de cada documento no docstore.jsonl
+    faiss_index/<versao>/codigos.json       -> chave (código IMPA) -> [id do FAISS, hash do conteúdo]
+
+Cada versão fica em um diretório próprio e o manifesto só é trocado depois que ela foi
+gravada por completo, então um processo nunca lê um índice pela metade.
+
+Atualização incremental do catálogo (gera embeddings apenas das linhas novas ou alteradas):
+    python indice_vetorial.py merged_data.xlsx
+
+Modos de índice (INDEX_MODE): 'flat' (busca exata, padrão), 'ivf' (listas invertidas) e
+'ivfpq' (listas invertidas com quantização por produto, para catálogos muito grandes).
+Comparação de recall@k e latência dos modos com o índice exato, no mesmo catálogo:
+    python indice_vetorial.py --benchmark
+"""
+import os
+import json
+import math
+import mmap
+import time
+import shutil
+import uuid
+import argparse
+from collections.abc import Mapping
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from catalogo import catalog_hash, content_hash, document_keys, load_catalog_documents, read_catalog_rows, write_catalog_csv
+
+INDEX_DIR = "faiss_index"
+MANIFEST_FILE = "manifest.json"
+STORE_VERSION = 1  # Alterar quando o formato dos arquivos mudar
+
+INDEX_MODE = os.getenv("INDEX_MODE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0))  # Número de listas; 0 = automático (~4 x raiz do nº de linhas)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))  # Listas visitadas por consulta (mais = mais recall, mais lento)
+IVF_TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", 50_000))  # Vetores usados no treino
+PQ_M = int(os.getenv("PQ_M", 32))  # Subvetores da quantização por produto
+IVF_RETRAIN_FACTOR = float(os.getenv("IVF_RETRAIN_FACTOR", 2))  # Retreina quando o catálogo cresce/encolhe este fator
+PQ_NBITS = 8
+
+def embedding_model_name(embeddings) -> str:
+    """Identifica o modelo de embeddings (ex.: 'text-embedding-ada-002')."""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+def read_manifest(directory: str = INDEX_DIR) -> dict:
+    """Lê o manifesto do índice; retorna None se ele não existir ou estiver corrompido."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_manifest(directory: str, manifest: dict):
+    tmp_path = os.path.join(directory, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+class MmapDocstore(Docstore):
+    """
+    Docstore somente leitura: os documentos ficam em disco e são lidos sob demanda via mmap,
+    de modo que vários processos no mesmo servidor compartilham as mesmas páginas de memória.
+    Os ids do docstore são os ids do FAISS convertidos para texto.
+    """
+
+    def __init__(self, directory: str):
+        self._ids = np.load(os.path.join(directory, "docstore_ids.npy"), mmap_mode="r")
+        self._offsets = np.load(os.path.join(directory, "docstore_offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "docstore.jsonl"), "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def search(self, search: str):
+        doc_id = int(search)
+        position = int(np.searchsorted(self._ids, doc_id))
+        if position >= len(self._ids) or self._ids[position] != doc_id:
+            return f"ID {search} not found."
+        item = json.loads(self._data[self._offsets[position]:self._offsets[position + 1]])
+        return Document(page_content=item["page_content"], metadata=item["metadata"])
+
+    def ids(self):
+        return self._ids
+
+class _IndexToDocstoreId(Mapping):
+    """Mapeia id do FAISS -> id do docstore sem materializar um dicionário em cada processo."""
+
+    def __init__(self, ids):
+        self._ids = ids
+
+    def __getitem__(self, key):
+        return str(int(key))
+
+    def __iter__(self):
+        return (int(doc_id) for doc_id in self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+def write_docstore(directory: str, ids, documents: list):
+    """Grava os documentos em JSON Lines, com a tabela de ids e posições ao lado."""
+    order = np.argsort(np.asarray(ids, dtype="int64"), kind="stable")
+    sorted_ids = np.asarray(ids, dtype="int64")[order]
+    offsets = np.zeros(len(documents) + 1, dtype="int64")
+    with open(os.path.join(directory, "docstore.jsonl"), "wb") as f:
+        for position, index in enumerate(order):
+            doc = documents[index]
+            line = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False)
+            f.write(line.encode("utf-8") + b"\n")
+            offsets[position + 1] = f.tell()
+    np.save(os.path.join(directory, "docstore_ids.npy"), sorted_ids)
+    np.save(os.path.join(directory, "docstore_offsets.npy"), offsets)
+
+def effective_mode(mode: str, count: int, nlist: int = IVF_NLIST) -> tuple:
+    """
+    Modo que um índice treinado com `count` vetores realmente usa e o número de listas: catálogos
+    pequenos demais para treinar as listas invertidas (ou a quantização) caem para um modo mais simples.
+    """
+    # O FAISS recomenda pelo menos ~39 vetores de treino por lista
+    nlist = min(nlist or int(4 * math.sqrt(count)), count // 39)
+    if mode == "ivfpq" and count < 2 ** PQ_NBITS * 39:
+        mode = "ivf"
+    if mode not in ("ivf", "ivfpq") or nlist < 2:
+        return "flat", nlist
+    return mode, nlist
+
+def needs_retrain(manifest: dict, count: int) -> bool:
+    """
+    Indica se o índice salvo deve ser reconstruído para um catálogo de `count` linhas: quando o modo
+    possível para esse tamanho mudou (ex.: caiu para 'flat' com o catálogo pequeno e agora comporta 'ivf')
+    ou quando as listas invertidas foram treinadas com um número de linhas muito diferente do atual.
+    """
+    mode = manifest.get("modo_indice", "flat")
+    if effective_mode(INDEX_MODE, count)[0] != mode:
+        return True
+    if mode == "flat":
+        return False  # Busca exata: não há treino a refazer
+    trained = manifest.get("linhas_treino") or manifest.get("documentos") or count
+    return not trained / IVF_RETRAIN_FACTOR <= count <= trained * IVF_RETRAIN_FACTOR
+
+def create_index(vectors, mode: str = INDEX_MODE, nlist: int = IVF_NLIST, pq_m: int = PQ_M,
+                 train_sample: int = IVF_TRAIN_SAMPLE):
+    """
+    Cria um índice vazio (já treinado, quando necessário) no modo pedido e retorna (índice, modo).
+    Catálogos pequenos demais para treinar as listas invertidas usam o modo 'flat'.
+    """
+    count, dimension = vectors.shape
+    mode, nlist = effective_mode(mode, count, nlist)
+    if mode == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension)), "flat"
+
+    quantizer = faiss.IndexFlatL2(dimension)
+    if mode == "ivfpq":
+        pq_m = max(m for m in range(1, min(pq_m, dimension) + 1) if dimension % m == 0)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, PQ_NBITS)
+    else:
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    sample = np.random.default_rng(0).choice(count, min(count, train_sample), replace=False)
+    index.train(np.ascontiguousarray(vectors[np.sort(sample)]))
+    return index, mode
+
+def set_nprobe(index, nprobe: int = IVF_NPROBE):
+    """Define quantas listas invertidas são visitadas por consulta (sem efeito no modo 'flat')."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+
+def _read_faiss_index(path: str, mode: str = "flat"):
+    if mode == "flat":
+        # IO_FLAG_MMAP_IFC mapeia os vetores de índices "flat" direto do arquivo (versões recentes do FAISS)
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    else:
+        flag = faiss.IO_FLAG_MMAP  # Mapeia as listas invertidas
+    try:
+        return faiss.read_index(path, flag)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+def save_index(index, documents: list, ids, keys: list, manifest: dict, directory: str = INDEX_DIR):
+    """
+    Grava uma nova versão do índice e do docstore e, por último, aponta o manifesto para ela.
+    Versões antigas são removidas (processos que ainda as mapeiam continuam funcionando).
+    """
+    version = f"{manifest['hash_catalogo'][:16]}-{uuid.uuid4().hex[:8]}"
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir, exist_ok=True)
+    faiss.write_index(index, os.path.join(version_dir, "index.faiss"))
+    write_docstore(version_dir, ids, documents)
+    codes = {key: [int(doc_id), content_hash(doc.page_content)] for key, doc_id, doc in zip(keys, ids, documents)}
+    with open(os.path.join(version_dir, "codigos.json"), "w", encoding="utf-8") as f:
+        json.dump(codes, f, ensure_ascii=False)
+
+    previous = read_manifest(directory)
+    _write_manifest(directory, dict(manifest, versao=STORE_VERSION, diretorio=version, documentos=len(documents)))
+    if previous and previous.get("diretorio") not in (None, version):
+        shutil.rmtree(os.path.join(directory, previous["diretorio"]), ignore_errors=True)
+
+def load_index(embeddings, catalog_path: str, directory: str = INDEX_DIR):
+    """
+    Carrega o índice salvo se o manifesto corresponder ao catálogo atual e ao modelo de embeddings.
+    Retorna None quando o índice precisa ser (re)construído.
+    """
+    manifest = read_manifest(directory)
+    if (
+        not manifest
+        or manifest.get("versao") != STORE_VERSION
+        or manifest.get("hash_catalogo") != catalog_hash(catalog_path)
+        or manifest.get("modelo_embeddings") != embedding_model_name(embeddings)
+        or manifest.get("modo_pedido", "flat") != INDEX_MODE
+    ):
+        return None
+    version_dir = os.path.join(directory, manifest["diretorio"])
+    index = _read_faiss_index(os.path.join(version_dir, "index.faiss"), manifest.get("modo_indice", "flat"))
+    set_nprobe(index)
+    docstore = MmapDocstore(version_dir)
+    return FAISS(embeddings, index, docstore, _IndexToDocstoreId(docstore.ids()))
+
+def _load_previous_codes(embeddings, directory: str):
+    """
+    Retorna (índice, códigos) da versão atual, aberta para escrita, ou (None, {}) se ela
+    não puder ser reaproveitada (inexistente, outro formato, outro modelo de embeddings
+    ou outro modo de índice).
+    """
+    manifest = read_manifest(directory)
+    if (
+        not manifest
+        or manifest.get("versao") != STORE_VERSION
+        or manifest.get("modelo_embeddings") != embedding_model_name(embeddings)
+        or manifest.get("modo_pedido", "flat") != INDEX_MODE
+    ):
+        return None, {}
+    version_dir = os.path.join(directory, manifest["diretorio"])
+    try:
+        with open(os.path.join(version_dir, "codigos.json"), encoding="utf-8") as f:
+            codes = json.load(f)
+        return faiss.read_index(os.path.join(version_dir, "index.faiss")), codes
+    except (OSError, ValueError, RuntimeError):
+        return None, {}
+
+def update_index(embeddings, catalog_path: str, directory: str = INDEX_DIR) -> dict:
+    """
+    Atualiza o índice a partir do catálogo, usando o código IMPA como chave: gera embeddings
+    só das linhas novas ou alteradas, remove do índice as linhas que saíram do catálogo e mantém
+    o restante. Sem uma versão anterior aproveitável, indexa o catálogo inteiro. Se o catálogo
+    mudou de tamanho a ponto de o treino do índice não servir mais (ver needs_retrain), o índice
+    é reconstruído com todas as linhas (os embeddings inalterados vêm do cache de embeddings).
+    Retorna um resumo com as contagens e as chamadas de embedding economizadas.
+    """
+    documents = load_catalog_documents(catalog_path)
+    keys = document_keys(documents)
+    index, previous_codes = _load_previous_codes(embeddings, directory)
+    previous_manifest = read_manifest(directory) if index is not None else {}
+    mode = previous_manifest.get("modo_indice", "flat") if index is not None else None
+    trained_rows = previous_manifest.get("linhas_treino") or previous_manifest.get("documentos")
+    retrain = index is not None and needs_retrain(previous_manifest, len(documents))
+    if retrain:
+        index = None
+
+    added, changed, unchanged = [], [], []
+    for position, (key, doc) in enumerate(zip(keys, documents)):
+        previous = previous_codes.get(key)
+        if previous is None:
+            added.append(position)
+        elif previous[1] != content_hash(doc.page_content):
+            changed.append(position)
+        else:
+            unchanged.append(position)
+    current_keys = set(keys)
+    removed = [key for key in previous_codes if key not in current_keys]
+
+    ids = np.zeros(len(documents), dtype="int64")
+    for position in unchanged:
+        ids[position] = previous_codes[keys[position]][0]
+
+    stale_ids = [previous_codes[key][0] for key in removed] + [previous_codes[keys[p]][0] for p in changed]
+    if index is not None and stale_ids:
+        index.remove_ids(np.asarray(stale_ids, dtype="int64"))
+
+    to_embed = list(range(len(documents))) if retrain else added + changed
+    if to_embed:
+        vectors = np.asarray(
+            embeddings.embed_documents([documents[p].page_content for p in to_embed]), dtype="float32"
+        )
+        if index is None:
+            index, mode = create_index(vectors)
+            trained_rows = len(to_embed)
+        next_id = max((value[0] for value in previous_codes.values()), default=-1) + 1
+        new_ids = np.arange(next_id, next_id + len(to_embed), dtype="int64")
+        ids[to_embed] = new_ids
+        index.add_with_ids(vectors, new_ids)
+
+    manifest = {
+        "catalogo": os.path.basename(catalog_path),
+        "hash_catalogo": catalog_hash(catalog_path),
+        "modelo_embeddings": embedding_model_name(embeddings),
+        "dimensao": int(index.d),
+        "modo_pedido": INDEX_MODE,
+        "modo_indice": mode,
+        "linhas_treino": trained_rows,
+    }
+    save_index(index, documents, ids, keys, manifest, directory)
+    return {
+        "adicionados": len(added),
+        "alterados": len(changed),
+        "removidos": len(removed),
+        "inalterados": len(unchanged),
+        "embeddings_gerados": len(to_embed),
+        "embeddings_economizados": len(documents) - len(to_embed),
+        "retreinado": retrain,
+    }
+
+def benchmark_index_modes(vectors, queries, k: int = 10, modes=("ivf", "ivfpq"), nprobes=(1, 4, 8, 16, 32)) -> list:
+    """
+    Compara os modos aproximados com o índice exato ('flat') nos mesmos vetores.
+    Para cada modo e nprobe, mede o recall@k (fração dos k vizinhos exatos encontrados),
+    a latência por consulta e o tamanho do índice serializado.
+    """
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, k)
+
+    def measure(index, mode, nprobe=None):
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            _, found = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(set(found[0]) & set(expected)) / k)
+        return {
+            "modo": mode,
+            "nprobe": nprobe,
+            f"recall@{k}": float(np.mean(recalls)),
+            "latencia_media_ms": float(np.mean(latencies)),
+            "latencia_p95_ms": float(np.percentile(latencies, 95)),
+            "tamanho_bytes": int(faiss.serialize_index(index).nbytes),
+        }
+
+    results = [measure(flat, "flat")]
+    for requested in modes:
+        index, mode = create_index(vectors, requested)
+        if mode != requested:
+            continue  # Catálogo pequeno demais para este modo
+        index.add(vectors)
+        for nprobe in nprobes:
+            set_nprobe(index, nprobe)
+            results.append(measure(index, mode, nprobe))
+    return results
+
+def _run_benchmark(embeddings, catalog_path: str, k: int, query_count: int):
+    documents = load_catalog_documents(catalog_path)
+    vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype="float32")
+    # Consultas: a descrição em inglês de linhas sorteadas do catálogo (texto diferente do indexado)
+    sample = np.random.default_rng(1).choice(len(documents), min(query_count, len(documents)), replace=False)
+    query_texts = []
+    for position in sample:
+        lines = documents[position].page_content.splitlines()
+        query_texts.append(lines[-1].partition(":")[2].strip() or lines[0])
+    queries = np.asarray(embeddings.embed_documents(query_texts), dtype="float32")
+
+    print(f"{len(documents)} linhas, {len(queries)} consultas, k={k}")
+    print(f"{'modo':<7}{'nprobe':>7}{'recall':>9}{'média ms':>10}{'p95 ms':>9}{'tamanho':>12}")
+    for result in benchmark_index_modes(vectors, queries, k):
+        print(
+            f"{result['modo']:<7}{result['nprobe'] or '-':>7}{result[f'recall@{k}']:>9.3f}"
+            f"{result['latencia_media_ms']:>10.3f}{result['latencia_p95_ms']:>9.3f}{result['tamanho_bytes']:>12}"
+        )
+
+def main():
+    from dotenv import load_dotenv
+    from cache_embeddings import create_embeddings
+
+    parser = argparse.ArgumentParser(description="Atualiza o índice vetorial a partir de uma nova versão do catálogo.")
+    parser.add_argument("catalogo", nargs="?", default="merged_data.csv", help="Catálogo em CSV ou Excel.")
+    parser.add_argument("--csv", default="merged_data.csv", help="CSV lido pelo agente (gerado a partir do Excel).")
+    parser.add_argument("--diretorio", default=INDEX_DIR, help="Diretório do índice.")
+    parser.add_argument("--benchmark", action="store_true", help="Compara recall@k e latência dos modos de índice.")
+    parser.add_argument("--k", type=int, default=10, help="Vizinhos avaliados no benchmark.")
+    parser.add_argument("--consultas", type=int, default=200, help="Consultas usadas no benchmark.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    catalog_path = args.catalogo
+    if os.path.splitext(catalog_path)[1].lower() in (".xlsx", ".xls"):
+        # O agente lê o CSV; ele é regravado para que catálogo e índice continuem sincronizados
+        write_catalog_csv(read_catalog_rows(catalog_path), args.csv)
+        catalog_path = args.csv
+
+    embeddings = create_embeddings()
+    if args.benchmark:
+        _run_benchmark(embeddings, catalog_path, args.k, args.consultas)
+        return
+    report = update_index(embeddings, catalog_path, args.diretorio)
+    print("Adicionados:", report["adicionados"])
+    print("Alterados:", report["alterados"])
+    print("Removidos:", report["removidos"])
+    print("Inalterados:", report["inalterados"])
+    if report["retreinado"]:
+        print("Índice reconstruído: o tamanho do catálogo mudou além do treino do índice.")
+    print("Chamadas de embedding economizadas:", report["embeddings_economizados"])
+    print("Cache de embeddings:", embeddings.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Rastreamento de latência do assistente.
+Cada pergunta do chat e cada PDF processado formam um "trace"; as etapas dentro dele
+(busca no catálogo, embeddings, busca na web, chamadas ao modelo, extração do PDF...) são
+registradas como "spans" com duração, situação e atributos (tokens, acertos de cache etc.).
+
+Os spans são gravados em segundo plano em um arquivo SQLite local (METRICS_FILE), lido pela
+página de administração (streamlit run metricas_admin.py) e exportável para ferramentas offline:
+    python metricas.py exportar metricas.jsonl --horas 24
+    python metricas.py resumo
+"""
+import os
+import csv
+import json
+import time
+import uuid
+import queue
+import atexit
+import sqlite3
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+
+METRICS_FILE = os.getenv("METRICS_FILE", "metricas.sqlite")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_RETENTION_DAYS = float(os.getenv("METRICS_RETENTION_DAYS", 14))
+FIELDS = ("trace_id", "span_id", "pai_id", "etapa", "inicio", "duracao_ms", "situacao", "atributos")
+
+# (trace_id, span_id) do span em andamento na thread/contexto atual.
+# Tarefas em outras threads entram no trace se rodarem com contextvars.copy_context().run
+_current = contextvars.ContextVar("metricas_span", default=None)
+
+class MetricsStore:
+    """
+    Armazena os spans em SQLite. As gravações passam por uma fila e são feitas por uma thread
+    própria, em lotes, para não somar a escrita em disco à latência das etapas medidas.
+    """
+
+    def __init__(self, path: str = METRICS_FILE, retention_days: float = METRICS_RETENTION_DAYS):
+        self.path = path
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spans ("
+            "trace_id TEXT, span_id TEXT PRIMARY KEY, pai_id TEXT, etapa TEXT, inicio REAL, "
+            "duracao_ms REAL, situacao TEXT, atributos TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spans_inicio ON spans (inicio)")
+        if retention_days > 0:
+            self._conn.execute("DELETE FROM spans WHERE inicio < ?", (time.time() - retention_days * 86400,))
+        self._conn.commit()
+        threading.Thread(target=self._writer, name="metricas", daemon=True).start()
+        atexit.register(self.flush)
+
+    def add(self, span: dict):
+        self._queue.put(span)
+
+    def _write(self, spans: list):
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO spans ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                [tuple(json.dumps(s[f], ensure_ascii=False) if f == "atributos" else s[f] for f in FIELDS) for s in spans],
+            )
+            self._conn.commit()
+
+    def _drain(self) -> list:
+        spans = []
+        while True:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                return spans
+
+    def _write_batch(self, spans: list):
+        try:
+            self._write(spans)
+        except sqlite3.Error as e:
+            print(f"[métricas] erro ao gravar {len(spans)} spans: {e}")
+        finally:
+            for _ in spans:
+                self._queue.task_done()
+
+    def _writer(self):
+        while True:
+            spans = [self._queue.get()]
+            time.sleep(0.5)  # Junta os spans que chegarem em seguida em uma única transação
+            self._write_batch(spans + self._drain())
+
+    def flush(self):
+        """Grava os spans que ainda estão na fila e espera o lote em gravação pela thread terminar."""
+        spans = self._drain()
+        if spans:
+            self._write_batch(spans)
+        self._queue.join()
+
+    def query(self, since: float = None, stage: str = None) -> list:
+        """Spans gravados a partir de `since` (epoch), opcionalmente de uma única etapa, do mais antigo ao mais recente."""
+        self.flush()
+        sql, params = f"SELECT {', '.join(FIELDS)} FROM spans WHERE inicio >= ?", [since or 0]
+        if stage:
+            sql += " AND etapa = ?"
+            params.append(stage)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY inicio", params).fetchall()
+        return [dict(zip(FIELDS, row[:-1]), atributos=json.loads(row[-1] or "{}")) for row in rows]
+
+    def export(self, path: str, since: float = None) -> int:
+        """Exporta os spans para JSONL ou CSV (conforme a extensão). Retorna a quantidade exportada."""
+        spans = self.query(since)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                writer.writeheader()
+                writer.writerows(dict(s, atributos=json.dumps(s["atributos"], ensure_ascii=False)) for s in spans)
+            else:
+                for s in spans:
+                    f.write(json.dumps(s, ensure_ascii=False) + "\n")
+        return len(spans)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> MetricsStore:
+    """Armazenamento de métricas do processo, criado no primeiro uso."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetricsStore()
+        return _store
+
+def _emit(trace_id, span_id, parent_id, stage, start, seconds, status, attrs):
+    if METRICS_ENABLED:
+        get_store().add({
+            "trace_id": trace_id, "span_id": span_id, "pai_id": parent_id, "etapa": stage,
+            "inicio": start, "duracao_ms": seconds * 1000, "situacao": status, "atributos": attrs,
+        })
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Mede uma etapa. Fora de um trace, a etapa abre um trace próprio.
+    O dicionário retornado pode receber atributos durante a etapa (ex.: s["cache"] = "acerto").
+    """
+    parent = _current.get()
+    trace_id = parent[0] if parent else uuid.uuid4().hex
+    span_id = uuid.uuid4().hex
+    token = _current.set((trace_id, span_id))
+    start, wall_start, status = time.perf_counter(), time.time(), "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "erro"
+        attrs.setdefault("erro", f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        _current.reset(token)
+        _emit(trace_id, span_id, parent[1] if parent else None, stage, wall_start,
+              time.perf_counter() - start, status, attrs)
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Inicia um novo trace (uma pergunta, um PDF), mesmo que já exista um em andamento."""
+    token = _current.set(None)
+    try:
+        with span(name, **attrs) as root_attrs:
+            yield root_attrs
+    finally:
+        _current.reset(token)
+
+def record(stage: str, seconds: float, status: str = "ok", **attrs):
+    """Registra uma etapa já medida (ex.: uma resposta em streaming, consumida aos poucos)."""
+    parent = _current.get()
+    _emit(parent[0] if parent else uuid.uuid4().hex, uuid.uuid4().hex, parent[1] if parent else None,
+          stage, time.time() - seconds, seconds, status, attrs)
+
+# ------------------------ RESUMOS ------------------------
+def summarize(spans: list) -> list:
+    """
+    Uma linha por etapa: quantidade, erros, p50/p95/p99/máximo em ms, tokens e taxa de acerto de cache.
+    O cache é contado pelo atributo "cache" ("acerto"/"falha") ou pelos contadores "acertos"/"falhas".
+    """
+    import numpy as np
+
+    by_stage = {}
+    for s in spans:
+        by_stage.setdefault(s["etapa"], []).append(s)
+    rows = []
+    for stage, items in sorted(by_stage.items()):
+        durations = np.array([s["duracao_ms"] for s in items])
+        p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+        hits = misses = 0
+        tokens_prompt = tokens_response = 0
+        for s in items:
+            attrs = s["atributos"]
+            hits += attrs.get("acertos", 0) + (attrs.get("cache") == "acerto")
+            misses += attrs.get("falhas", 0) + (attrs.get("cache") == "falha")
+            tokens_prompt += attrs.get("tokens_prompt", 0)
+            tokens_response += attrs.get("tokens_resposta", 0)
+        rows.append({
+            "etapa": stage,
+            "quantidade": len(items),
+            "erros": sum(s["situacao"] == "erro" for s in items),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "max_ms": round(float(durations.max()), 1),
+            "tokens_prompt": tokens_prompt,
+            "tokens_resposta": tokens_response,
+            "acerto_cache": round(hits / (hits + misses), 3) if hits + misses else None,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta ou resume as métricas de latência do assistente.")
+    parser.add_argument("comando", choices=("exportar", "resumo"))
+    parser.add_argument("arquivo", nargs="?", default="metricas.jsonl", help="Destino da exportação (.jsonl ou .csv).")
+    parser.add_argument("--horas", type=float, default=None, help="Somente as últimas N horas.")
+    args = parser.parse_args()
+
+    since = time.time() - args.horas * 3600 if args.horas else None
+    store = get_store()
+    if args.comando == "exportar":
+        print(f"{store.export(args.arquivo, since)} spans exportados para {args.arquivo}")
+        return
+    for row in summarize(store.query(since)):
+        print(
+            f"{row['etapa']:<24} n={row['quantidade']:<6} p50={row['p50_ms']:>9.1f}ms "
+            f"p95={row['p95_ms']:>9.1f}ms p99={row['p99_ms']:>9.1f}ms erros={row['erros']}"
+        )
+
+if __name__ == "__main__":
+    main()
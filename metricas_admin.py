@@ -0,0 +1,85 @@
+"""
+Página de administração com as métricas de latência do assistente:
+    streamlit run metricas_admin.py
+Fica fora do agente.py para não aparecer para os usuários do chat.
+"""
+import os
+import time
+import tempfile
+
+import pandas as pd
+import streamlit as st
+
+from metricas import get_store, summarize
+
+st.set_page_config(page_title="Métricas do Assistente NavSupply", layout="wide")
+st.title("Métricas de latência")
+
+WINDOWS = {"Última hora": 3600, "Últimas 24 horas": 86400, "Últimos 7 dias": 7 * 86400, "Tudo": None}
+ROOT_STAGES = ("chat", "pdf", "lote_pdf", "equasis_imo")  # Etapas que abrem um trace (uma pergunta, um PDF, um IMO)
+
+window = st.sidebar.selectbox("Período", list(WINDOWS), index=1)
+since = time.time() - WINDOWS[window] if WINDOWS[window] else None
+store = get_store()
+spans = store.query(since)
+st.sidebar.caption(f"Arquivo: {store.path} | {len(spans)} spans no período")
+if st.sidebar.button("Atualizar"):
+    st.rerun()
+
+if not spans:
+    st.info("Nenhuma métrica registrada no período. Use o chat ou envie um PDF no assistente.")
+    st.stop()
+
+# ------------------------ RESUMO POR ETAPA ------------------------
+st.header("Percentis por etapa")
+summary = pd.DataFrame(summarize(spans)).set_index("etapa")
+st.dataframe(
+    summary,
+    column_config={
+        "acerto_cache": st.column_config.NumberColumn("acerto_cache", format="percent"),
+    },
+    use_container_width=True,
+)
+st.bar_chart(summary[["p50_ms", "p95_ms", "p99_ms"]], stack=False)
+
+# ------------------------ TRACES MAIS LENTOS ------------------------
+st.header("Traces mais lentos")
+roots = sorted(
+    (s for s in spans if s["etapa"] in ROOT_STAGES and s["pai_id"] is None),
+    key=lambda s: s["duracao_ms"],
+    reverse=True,
+)[:20]
+if roots:
+    options = {
+        f"{time.strftime('%d/%m %H:%M:%S', time.localtime(s['inicio']))} | {s['etapa']} | "
+        f"{s['duracao_ms']:.0f} ms | {s['atributos'].get('arquivo', '')}": s["trace_id"]
+        for s in roots
+    }
+    chosen = st.selectbox("Trace", list(options))
+    trace_spans = [s for s in spans if s["trace_id"] == options[chosen]]
+    trace_start = min(s["inicio"] for s in trace_spans)
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "etapa": s["etapa"],
+                "inicio_ms": round((s["inicio"] - trace_start) * 1000, 1),
+                "duracao_ms": round(s["duracao_ms"], 1),
+                "situacao": s["situacao"],
+                "atributos": s["atributos"],
+            }
+            for s in sorted(trace_spans, key=lambda s: s["inicio"])
+        ]),
+        use_container_width=True,
+    )
+else:
+    st.write("Nenhum trace completo no período.")
+
+# ------------------------ EXPORTAÇÃO ------------------------
+st.header("Exportar")
+st.caption("Também pelo terminal: python metricas.py exportar metricas.jsonl --horas 24")
+export_format = st.radio("Formato", ["jsonl", "csv"], horizontal=True)
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, f"metricas.{export_format}")
+    store.export(path, since)
+    with open(path, "rb") as f:
+        st.download_button("Baixar métricas do período", f.read(), file_name=f"metricas.{export_format}")
@@ -0,0 +1,93 @@
+"""
+Modelos falsos (chat e embeddings) para testes e benchmarks sem chamadas à OpenAI.
+São determinísticos e simulam a latência da API:
+    LLM_PROVIDER=fake         FAKE_LLM_LATENCY (s até o 1º pedaço), FAKE_LLM_TOKEN_LATENCY (s por pedaço)
+    EMBEDDINGS_PROVIDER=fake  FAKE_EMBEDDINGS_SIZE, FAKE_EMBEDDINGS_LATENCY (s por chamada),
+                              FAKE_EMBEDDINGS_TEXT_LATENCY (s por texto)
+"""
+import os
+import re
+import time
+import hashlib
+
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", 0))
+FAKE_LLM_TOKEN_LATENCY = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", 0))
+FAKE_EMBEDDINGS_SIZE = int(os.getenv("FAKE_EMBEDDINGS_SIZE", 256))
+FAKE_EMBEDDINGS_LATENCY = float(os.getenv("FAKE_EMBEDDINGS_LATENCY", 0))
+FAKE_EMBEDDINGS_TEXT_LATENCY = float(os.getenv("FAKE_EMBEDDINGS_TEXT_LATENCY", 0))
+
+# Palavras que fazem o modelo falso responder que o trecho não descreve um produto
+NOT_PRODUCT_WORDS = {"TEL", "FONE", "FAX", "CEP", "PEDIDO", "ORDER", "DATA", "DATE", "PAGE", "PAGINA", "CNPJ", "TOTAL"}
+
+def looks_like_product(context: str) -> bool:
+    words = re.findall(r"[A-Za-zÀ-ÿ]{3,}", context)
+    return len(words) >= 2 and not NOT_PRODUCT_WORDS.intersection(word.upper() for word in words)
+
+class FakeChatModel(BaseChatModel):
+    """
+    Responde aos prompts do agente sem rede: vereditos 'sim'/'não' (individuais ou em lote)
+    e uma explicação fixa, derivada do texto do prompt, para os demais.
+    """
+
+    latency: float = FAKE_LLM_LATENCY
+    token_latency: float = FAKE_LLM_TOKEN_LATENCY
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-navsupply"
+
+    def answer(self, prompt: str) -> str:
+        if "número: sim" in prompt:
+            items = re.findall(r'^(\d+)\. "(.*)"$', prompt, re.MULTILINE)
+            return "\n".join(f"{number}: {'sim' if looks_like_product(text) else 'não'}" for number, text in items)
+        if "Responda apenas 'sim' ou 'não'" in prompt:
+            quoted = re.search(r'"(.*)"', prompt, re.DOTALL)
+            return "sim" if quoted and looks_like_product(quoted.group(1)) else "não"
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        subject = " ".join(prompt.strip().splitlines()[-1].split()[:12])
+        return (
+            f"Resposta simulada {digest}. Trata-se de um item de uso marítimo relacionado a: {subject}. "
+            f"É utilizado a bordo em rotinas de manutenção e operação, e deve ser comprado conforme "
+            f"a especificação do fabricante e as normas aplicáveis."
+        )
+
+    def _usage(self, messages, text: str) -> dict:
+        prompt_tokens = sum(len(str(m.content)) // 4 + 1 for m in messages)
+        return {"token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4 + 1}}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = self.answer(str(messages[-1].content))
+        time.sleep(self.latency + self.token_latency * len(text.split()))
+        message = AIMessage(content=text, response_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self.answer(str(messages[-1].content))
+        time.sleep(self.latency)
+        yield ChatGenerationChunk(message=AIMessageChunk(content=""))  # Como a API, o 1º pedaço vem vazio
+        for word in re.findall(r"\S+\s*", text):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+class FakeEmbeddings(Embeddings):
+    """Embeddings determinísticos (mesmo texto, mesmo vetor) com latência simulada por chamada e por texto."""
+
+    def __init__(self, size: int = FAKE_EMBEDDINGS_SIZE, latency: float = FAKE_EMBEDDINGS_LATENCY,
+                 text_latency: float = FAKE_EMBEDDINGS_TEXT_LATENCY):
+        self.model = f"fake-{size}"
+        self.latency = latency
+        self.text_latency = text_latency
+        self._underlying = DeterministicFakeEmbedding(size=size)
+
+    def embed_documents(self, texts: list) -> list:
+        time.sleep(self.latency + self.text_latency * len(texts))
+        return self._underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        time.sleep(self.latency + self.text_latency)
+        return self._underlying.embed_query(text)
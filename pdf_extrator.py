@@ -0,0 +1,70 @@
+"""
+Extração de códigos IMPA de arquivos PDF.
+Fica separada do agente.py para que possa rodar em processos do pool sem importar o Streamlit.
+"""
+import io
+import os
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import PyPDF2
+
+CODE_PATTERN = re.compile(r'(\d{6})')  # Busca sequências de 6 dígitos
+
+def iter_pages(file):
+    """
+    Lê o PDF e gera o texto de uma página por vez, sem montar o texto completo em memória.
+    """
+    pdf_reader = PyPDF2.PdfReader(file)
+    for page in pdf_reader.pages:
+        text = page.extract_text()
+        if text:
+            yield text
+
+def extract_codes(pages) -> list:
+    """
+    Percorre as páginas uma única vez e guarda, para cada código encontrado,
+    a primeira linha em que ele aparece (como contexto).
+    Retorna uma lista de tuplas: (codigo, contexto).
+    """
+    found = {}
+    for text in pages:
+        for line in text.splitlines():
+            for code in CODE_PATTERN.findall(line):
+                if code not in found:
+                    found[code] = line.strip()
+    return list(found.items())
+
+def process_pdf_bytes(name: str, data: bytes) -> tuple:
+    """
+    Processa o conteúdo de um PDF (executado dentro do pool de processos).
+    Retorna (nome, resultados, erro); em caso de falha, resultados vem vazio e erro com a mensagem.
+    """
+    try:
+        return name, extract_codes(iter_pages(io.BytesIO(data))), None
+    except Exception as e:
+        return name, [], str(e)
+
+def create_pool(max_workers: int = None) -> ProcessPoolExecutor:
+    """
+    Cria o pool de processos para extração. Usa 'spawn' para não duplicar as threads
+    do servidor do Streamlit nos processos filhos.
+    """
+    if max_workers is None:
+        max_workers = int(os.getenv("PDF_WORKERS", os.cpu_count() or 1))
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+def process_pdfs(files: list, pool: ProcessPoolExecutor = None):
+    """
+    Processa vários PDFs, recebidos como lista de (nome, bytes), e gera (nome, resultados, erro)
+    à medida que cada arquivo termina. Sem pool (ou com um único arquivo) roda no próprio processo.
+    """
+    if pool is None or len(files) <= 1:
+        for name, data in files:
+            yield process_pdf_bytes(name, data)
+        return
+
+    futures = [pool.submit(process_pdf_bytes, name, data) for name, data in files]
+    for future in as_completed(futures):
+        yield future.result()
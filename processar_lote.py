@@ -0,0 +1,249 @@
+"""
+Processamento em lote, sem interface, de cotações em PDF.
+Usa as mesmas funções do agente.py (extração dos códigos, filtro dos candidatos, validação e
+identificação dos produtos) e grava os resultados à medida que cada arquivo termina:
+
+    python processar_lote.py cotacoes/ --saida resultados.jsonl
+    python processar_lote.py cotacoes/ --saida resultados.csv --paralelo 4
+
+A extração roda em um pool de processos (PDF_WORKERS) e a identificação de vários arquivos
+ao mesmo tempo em threads (--paralelo). O progresso fica em <saida>.checkpoint: se a execução
+for interrompida, o mesmo comando continua de onde parou, pulando os arquivos já concluídos
+(e que não foram alterados desde então).
+"""
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from pdf_extrator import create_pool, process_pdf_bytes
+
+FIELDS = ("arquivo", "codigo", "contexto", "situacao", "produto")
+BATCH_PARALLEL_FILES = int(os.getenv("BATCH_PARALLEL_FILES", 2))  # Arquivos identificados ao mesmo tempo
+
+def list_pdfs(directory: str) -> list:
+    """Caminhos dos PDFs da pasta (e subpastas), em ordem."""
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(".pdf"))
+    return sorted(paths)
+
+def file_signature(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def checkpoint_path(output: str) -> str:
+    return output + ".checkpoint"
+
+def load_checkpoint(path: str) -> dict:
+    """Arquivos já concluídos em execuções anteriores: nome -> assinatura (tamanho e data)."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Última linha incompleta de uma execução interrompida
+                done[entry["arquivo"]] = entry["assinatura"]
+    return done
+
+class ResultWriter:
+    """
+    Grava as linhas de resultado em CSV ou JSONL (conforme a extensão), acrescentando ao arquivo
+    de uma execução anterior. Cada lote é gravado em disco antes de o arquivo entrar no checkpoint.
+    """
+
+    def __init__(self, path: str):
+        self.format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        if self.format == "csv":
+            self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, quoting=csv.QUOTE_ALL)
+            if is_new:
+                self._writer.writeheader()
+
+    def write(self, rows: list):
+        for row in rows:
+            if self.format == "csv":
+                self._writer.writerow(row)
+            else:
+                self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+def _append_line(f, entry: dict):
+    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def identify_file(name: str, pdf_results: list) -> tuple:
+    """
+    Filtra os candidatos de um PDF e identifica os produtos (mesmo fluxo do upload no agente).
+    Retorna (linhas, estatísticas do filtro), com as linhas na ordem em que os códigos aparecem no PDF.
+    """
+    import agente
+    from metricas import trace
+
+    with trace("lote_pdf", arquivo=name) as attrs:
+        accepted, ambiguous, stats = agente.filter_candidates(pdf_results, agente.load_catalog_index())
+        candidates = [(code, context, True) for code, context in accepted]
+        candidates += [(code, context, False) for code, context in ambiguous]
+        rows = []
+        for code, context, product in agente.identify_items(candidates):
+            if product is None:
+                situation = "rejeitado"
+            else:
+                situation = "identificado" if product else "nao_localizado"
+            rows.append({"arquivo": name, "codigo": code, "contexto": context, "situacao": situation, "produto": product or ""})
+        attrs.update(codigos=len(pdf_results), itens=len(rows))
+    order = {code: position for position, (code, _) in enumerate(pdf_results)}
+    rows.sort(key=lambda row: order.get(row["codigo"], len(order)))
+    return rows, stats
+
+def run_batch(directory: str, output: str, parallel: int = BATCH_PARALLEL_FILES,
+              workers: int = None, restart: bool = False) -> dict:
+    """
+    Processa os PDFs da pasta e grava os resultados em `output`. Retorna os totais da execução.
+    Interrupções (Ctrl+C) encerram os pools sem esperar e mantêm o checkpoint dos arquivos concluídos.
+    """
+    import agente
+
+    # Fora do Streamlit, cada thread sem sessão gera um aviso de "missing ScriptRunContext"
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    checkpoint = checkpoint_path(output)
+    if restart:
+        for path in (output, checkpoint):
+            if os.path.exists(path):
+                os.remove(path)
+    done = load_checkpoint(checkpoint)
+    todo, paths = [], list_pdfs(directory)
+    for path in paths:
+        name = os.path.relpath(path, directory)
+        if done.get(name) != file_signature(path):
+            todo.append((name, path))
+
+    totals = {
+        "arquivos": len(todo), "pulados": len(paths) - len(todo), "concluidos": 0, "erros": 0, "codigos": 0,
+        "identificados": 0, "nao_localizados": 0, "rejeitados": 0, "interrompido": False,
+    }
+    print(f"{len(todo)} arquivos para processar ({totals['pulados']} já concluídos em execuções anteriores).")
+    if not todo:
+        totals["segundos"] = 0.0
+        return totals
+
+    agente.wait_warmup()  # Catálogo e índices, antes de medir o tempo do lote
+    usage, _ = agente.get_usage_counter()
+    usage_before = dict(usage)
+    start = time.perf_counter()
+    queue = iter(todo)
+    workers = workers or int(os.getenv("PDF_WORKERS", os.cpu_count() or 1))
+    pool = create_pool(workers)
+    identifiers = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="lote")
+    writer = ResultWriter(output)
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8")
+    pending = {}
+
+    def submit_extraction():
+        # Só os arquivos em extração ficam em memória; o próximo é lido quando um termina
+        item = next(queue, None)
+        if item is not None:
+            name, path = item
+            with open(path, "rb") as f:
+                data = f.read()
+            pending[pool.submit(process_pdf_bytes, name, data)] = ("extracao", name, path, time.perf_counter())
+
+    try:
+        for _ in range(workers * 2):
+            submit_extraction()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                kind, name, path, file_start = pending.pop(future)
+                if kind == "extracao":
+                    submit_extraction()
+                    _, pdf_results, error = future.result()
+                    if error:
+                        totals["erros"] += 1
+                        print(f"Erro ao ler o PDF {name}: {error}")
+                        _append_line(checkpoint_file, {"arquivo": name, "assinatura": file_signature(path), "erro": error})
+                        continue
+                    totals["codigos"] += len(pdf_results)
+                    pending[identifiers.submit(identify_file, name, pdf_results)] = ("identificacao", name, path, file_start)
+                    continue
+
+                try:
+                    rows, stats = future.result()
+                except Exception as e:
+                    # Fica fora do checkpoint: será processado de novo na próxima execução
+                    totals["erros"] += 1
+                    print(f"Erro ao identificar os itens de {name}: {e}")
+                    continue
+                writer.write(rows)
+                _append_line(checkpoint_file, {"arquivo": name, "assinatura": file_signature(path), "itens": len(rows)})
+                totals["concluidos"] += 1
+                for row in rows:
+                    key = {"identificado": "identificados", "nao_localizado": "nao_localizados"}.get(row["situacao"], "rejeitados")
+                    totals[key] += 1
+                print(
+                    f"[{totals['concluidos'] + totals['erros']}/{len(todo)}] {name}: "
+                    f"{stats['candidatos']} candidatos, "
+                    f"{sum(row['situacao'] == 'identificado' for row in rows)} identificados "
+                    f"({time.perf_counter() - file_start:.1f}s)"
+                )
+    except KeyboardInterrupt:
+        totals["interrompido"] = True
+        print("Interrompido. Rode o mesmo comando para continuar de onde parou.")
+    finally:
+        pool.shutdown(wait=not totals["interrompido"], cancel_futures=True)
+        identifiers.shutdown(wait=not totals["interrompido"], cancel_futures=True)
+        writer.close()
+        checkpoint_file.close()
+
+    totals["segundos"] = time.perf_counter() - start
+    for key in ("requisicoes", "tokens_prompt", "tokens_resposta"):
+        totals[key] = usage[key] - usage_before[key]
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Identifica os itens de uma pasta de cotações em PDF, sem interface.")
+    parser.add_argument("pasta", help="Pasta com os PDFs (subpastas incluídas).")
+    parser.add_argument("--saida", default="resultados_lote.jsonl", help="Arquivo de resultados (.jsonl ou .csv).")
+    parser.add_argument("--paralelo", type=int, default=BATCH_PARALLEL_FILES,
+                        help="Arquivos com identificação em andamento ao mesmo tempo.")
+    parser.add_argument("--workers", type=int, default=None, help="Processos de extração (padrão: PDF_WORKERS ou nº de CPUs).")
+    parser.add_argument("--recomecar", action="store_true", help="Ignora o checkpoint e apaga os resultados anteriores.")
+    args = parser.parse_args()
+
+    totals = run_batch(args.pasta, args.saida, args.paralelo, args.workers, args.recomecar)
+    if not totals["arquivos"]:
+        return
+    minutes = totals["segundos"] / 60 or 1e-9
+    processed = totals["concluidos"] + totals["erros"]
+    print(
+        f"Arquivos: {totals['concluidos']} concluídos, {totals['erros']} com erro, "
+        f"{totals['pulados']} pulados (checkpoint)"
+    )
+    print(
+        f"Códigos: {totals['codigos']} candidatos, {totals['identificados']} identificados, "
+        f"{totals['nao_localizados']} não localizados no catálogo, {totals['rejeitados']} rejeitados"
+    )
+    print(
+        f"Tempo: {totals['segundos']:.1f}s | {processed / minutes:.1f} PDFs/min | "
+        f"{totals['codigos'] / (totals['segundos'] or 1e-9):.2f} códigos/s"
+    )
+    print(
+        f"Modelo: {totals['requisicoes']} requisições, {totals['tokens_prompt']} tokens enviados, "
+        f"{totals['tokens_resposta']} tokens recebidos"
+    )
+    if totals["interrompido"]:
+        raise SystemExit(130)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
 import os
+import re
+import sys
+import json
+import time
+import ssl
+import select
+import signal
 import imaplib
 import email
+import argparse
+import itertools
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 import openai
 import smtplib
@@ -14,9 +27,23 @@ IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
 IMAP_PORT = int(os.getenv("IMAP_PORT", 993))
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+# Desligar apenas para servidores locais de teste, sem TLS
+IMAP_SSL = os.getenv("IMAP_SSL", "1") != "0"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
 EMAIL_ACCOUNT = os.getenv("SENDER_EMAIL")
 EMAIL_PASSWORD = os.getenv("SENDER_PASSWORD")  # Senha de aplicativo do Gmail
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Modo em lote: último UID processado fica salvo aqui, e as mensagens são baixadas em blocos
+ESTADO_FILE = os.getenv("EMAIL_STATE_FILE", "reduzir_estado.json")
+TAMANHO_BLOCO = int(os.getenv("EMAIL_FETCH_CHUNK", 25))
+MAX_TENTATIVAS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 3))  # Falhas por mensagem antes de desistir dela
+# Modo daemon: IDLE renovado periodicamente (servidores derrubam IDLE com mais de 29 min)
+IDLE_TIMEOUT = float(os.getenv("EMAIL_IDLE_TIMEOUT", 300))
+SMTP_MAX_OCIOSO = float(os.getenv("SMTP_MAX_IDLE", 120))  # Acima disso, testa a sessão com NOOP antes de usar
+STATUS_FILE = os.getenv("EMAIL_STATUS_FILE", "reduzir_status.json")
+# Respostas geradas em paralelo, limitadas por minuto para não estourar a cota da OpenAI
+RESPOSTAS_CONCORRENTES = int(os.getenv("EMAIL_REPLY_CONCURRENCY", 4))
+RESPOSTAS_POR_MINUTO = float(os.getenv("EMAIL_REPLIES_PER_MINUTE", 60))
 
 openai.api_key = OPENAI_API_KEY
 
@@ -33,9 +60,104 @@ def gerar_resposta(email_content):
     )
     return response.choices[0].message.content.strip()
 
-def enviar_email(destinatario, assunto, corpo):
+class LimitadorTaxa:
+    """
+    Balde de fichas: libera até `rajada` chamadas de imediato e, depois, `por_minuto`
+    chamadas por minuto. aguardar() bloqueia a thread até a vez dela.
+    """
+
+    def __init__(self, por_minuto, rajada=1):
+        self.intervalo = 60.0 / por_minuto if por_minuto > 0 else 0.0
+        self.rajada = max(1, rajada)
+        self._fichas = float(self.rajada)
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.rajada, self._fichas + (agora - self._atualizado) / self.intervalo)
+            self._atualizado = agora
+            self._fichas -= 1  # Ficha negativa = vez reservada no futuro
+            espera = -self._fichas * self.intervalo if self._fichas < 0 else 0.0
+        time.sleep(espera)
+
+_limitador = LimitadorTaxa(RESPOSTAS_POR_MINUTO, RESPOSTAS_CONCORRENTES)
+
+def gerar_resposta_limitada(email_content):
+    """
+    gerar_resposta respeitando o limite de respostas por minuto do processo.
+    """
+    _limitador.aguardar()
+    return gerar_resposta(email_content)
+
+def conectar_smtp():
+    """
+    Abre uma sessão SMTP autenticada.
+    """
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
+    if SMTP_STARTTLS:
+        server.starttls()  # Inicia conexão segura
+    server.login(EMAIL_ACCOUNT, EMAIL_PASSWORD)
+    return server
+
+class SessaoSMTP:
+    """
+    Mantém uma sessão SMTP autenticada para várias respostas, em vez de conectar,
+    negociar TLS e autenticar a cada envio. Se o servidor derrubar a sessão,
+    reconecta e tenta o envio mais uma vez.
+    """
+
+    def __init__(self):
+        self._server = None
+        self._ultimo_uso = 0.0
+        self._lock = threading.Lock()
+        self.reconexoes = 0
+
+    def _sessao(self):
+        if self._server is not None and time.monotonic() - self._ultimo_uso > SMTP_MAX_OCIOSO:
+            try:
+                self._server.noop()
+            except (smtplib.SMTPException, OSError):
+                self._descartar()
+        if self._server is None:
+            self._server = conectar_smtp()
+        return self._server
+
+    def _descartar(self):
+        try:
+            self._server.close()
+        except Exception:
+            pass
+        self._server = None
+        self.reconexoes += 1
+
+    def enviar(self, msg):
+        with self._lock:
+            try:
+                self._sessao().send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError) as e:
+                if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421:
+                    raise  # Recusa da mensagem, não queda da sessão (421 = servidor encerrando)
+                self._descartar()
+                self._sessao().send_message(msg)
+            self._ultimo_uso = time.monotonic()
+
+    def fechar(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._server = None
+
+def enviar_email(destinatario, assunto, corpo, smtp=None):
     """
     Envia um e-mail de texto simples para o destinatário informado.
+    Com `smtp` (SessaoSMTP), reaproveita a sessão aberta em vez de abrir uma nova conexão.
     """
     remetente = EMAIL_ACCOUNT  # Ex: store@navsupply.com.br
     msg = MIMEText(corpo, 'plain')
@@ -43,9 +165,10 @@ def enviar_email(destinatario, assunto, corpo):
     msg['From'] = remetente
     msg['To'] = destinatario
 
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls()  # Inicia conexão segura
-        server.login(remetente, EMAIL_PASSWORD)
+    if smtp is not None:
+        smtp.enviar(msg)
+        return
+    with conectar_smtp() as server:
         server.send_message(msg)
 
 def buscar_ultimo_email():
@@ -80,24 +203,453 @@ def extrair_conteudo_email(msg):
             content_disposition = str(part.get("Content-Disposition"))
             if content_type == "text/plain" and "attachment" not in content_disposition:
                 try:
-                    body = part.get_payload(decode=True).decode()
+                    body = part.get_payload(decode=True).decode(part.get_content_charset() or "utf-8", "replace")
                 except Exception as e:
                     body = ""
                 break
     else:
         try:
-            body = msg.get_payload(decode=True).decode()
+            body = msg.get_payload(decode=True).decode(msg.get_content_charset() or "utf-8", "replace")
         except Exception as e:
             body = ""
     return remetente, subject, body
 
-def marcar_email_como_lido(mail, email_id):
+def marcar_email_como_lido(mail, email_id, uid=False):
     """
-    Marca o e-mail processado como lido.
+    Marca o e-mail processado como lido. Com uid=True, email_id é o UID da mensagem.
     """
-    mail.store(email_id, '+FLAGS', '\\Seen')
+    if uid:
+        mail.uid("STORE", email_id, '+FLAGS', '\\Seen')
+    else:
+        mail.store(email_id, '+FLAGS', '\\Seen')
 
-def main():
+def marcar_email_com_estrela(mail, uid):
+    """
+    Marca com estrela (\\Flagged) uma mensagem que não pôde ser respondida, para revisão manual.
+    """
+    mail.uid("STORE", uid, '+FLAGS', '\\Flagged')
+
+# ------------------------ MODO EM LOTE ------------------------
+def conectar_imap():
+    """
+    Abre uma sessão IMAP autenticada com a caixa de entrada selecionada.
+    Retorna a conexão e o UIDVALIDITY da caixa (muda quando os UIDs antigos deixam de valer).
+    """
+    mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT) if IMAP_SSL else imaplib.IMAP4(IMAP_SERVER, IMAP_PORT)
+    mail.login(EMAIL_ACCOUNT, EMAIL_PASSWORD)
+    mail.select("inbox")
+    _, dados = mail.response("UIDVALIDITY")
+    uidvalidity = int(dados[0]) if dados and dados[0] else 0
+    return mail, uidvalidity
+
+def carregar_estado():
+    """
+    Lê o último UID processado (e o UIDVALIDITY em que ele vale) do arquivo de estado.
+    """
+    try:
+        with open(ESTADO_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"uidvalidity": 0, "ultimo_uid": 0}
+
+def gravar_json(caminho, dados):
+    """
+    Grava em um arquivo temporário e o renomeia, para nunca deixar um JSON pela metade.
+    """
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+def salvar_estado(estado):
+    # Contagens de falhas de UIDs já ultrapassados não servem mais
+    tentativas = estado.setdefault("tentativas", {})
+    for uid in [uid for uid in tentativas if int(uid) <= estado["ultimo_uid"]]:
+        del tentativas[uid]
+    gravar_json(ESTADO_FILE, estado)
+
+def ultimo_uid_da_caixa(mail):
+    """
+    Último UID já atribuído na caixa selecionada (UIDNEXT - 1), usado como ponto de partida
+    quando não há estado salvo: só os e-mails que chegarem depois disso são respondidos.
+    """
+    _, dados = mail.response("UIDNEXT")  # Enviado pelo servidor no SELECT
+    if not dados or not dados[0]:
+        _, dados = mail.status("INBOX", "(UIDNEXT)")
+        encontrado = re.search(rb"UIDNEXT (\d+)", dados[0] or b"") if dados else None
+        dados = [encontrado.group(1)] if encontrado else None
+    if not dados or not dados[0]:
+        raise imaplib.IMAP4.error("o servidor não informou o UIDNEXT da caixa")
+    return int(dados[0]) - 1
+
+def buscar_uids_novos(mail, ultimo_uid):
+    """
+    UIDs das mensagens não lidas que chegaram depois de `ultimo_uid`, em ordem crescente.
+    A busca é feita no servidor, então o custo acompanha apenas os e-mails novos.
+    """
+    if ultimo_uid:
+        status, dados = mail.uid("SEARCH", None, f"UID {ultimo_uid + 1}:*", "UNSEEN")
+    else:
+        status, dados = mail.uid("SEARCH", None, "UNSEEN")
+    if status != "OK" or not dados or not dados[0]:
+        return []
+    # "N:*" sempre inclui a última mensagem da caixa, mesmo com UID menor que N
+    return sorted(uid for uid in map(int, dados[0].split()) if uid > ultimo_uid)
+
+def _ler_lista(texto):
+    """
+    Converte a primeira lista entre parênteses de uma resposta IMAP em listas Python
+    (strings entre aspas e átomos viram str, NIL vira None).
+    """
+    pilha = []
+    for token in re.findall(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+', texto):
+        if token == "(":
+            pilha.append([])
+        elif token == ")":
+            lista = pilha.pop()
+            if not pilha:
+                return lista
+            pilha[-1].append(lista)
+        elif pilha:
+            if token.startswith('"'):
+                pilha[-1].append(re.sub(r"\\(.)", r"\1", token[1:-1]))
+            else:
+                pilha[-1].append(None if token.upper() == "NIL" else token)
+    raise ValueError("lista IMAP incompleta")
+
+def localizar_parte_texto(estrutura, secao=""):
+    """
+    Percorre o BODYSTRUCTURE e retorna (seção, codificação, charset) da primeira parte
+    text/plain que não é anexo, ou None se a mensagem não tiver uma.
+    """
+    if estrutura and isinstance(estrutura[0], list):
+        # Multipart: as partes filhas vêm primeiro, seguidas do subtipo e das extensões
+        for numero, parte in enumerate(itertools.takewhile(lambda p: isinstance(p, list), estrutura), 1):
+            encontrada = localizar_parte_texto(parte, f"{secao}{numero}.")
+            if encontrada:
+                return encontrada
+        return None
+    if len(estrutura) < 7 or (str(estrutura[0]).lower(), str(estrutura[1]).lower()) != ("text", "plain"):
+        return None
+    if any(isinstance(campo, list) and campo and str(campo[0]).lower() == "attachment" for campo in estrutura[7:]):
+        return None
+    parametros = estrutura[2] or []
+    charset = dict(zip((str(p).lower() for p in parametros[::2]), parametros[1::2])).get("charset") or "utf-8"
+    return secao.rstrip(".") or "1", estrutura[5] or "7bit", charset
+
+def buscar_estruturas(mail, uids):
+    """
+    BODYSTRUCTURE de cada UID ({uid: estrutura}), sem baixar o conteúdo das mensagens.
+    """
+    status, dados = mail.uid("FETCH", ",".join(map(str, uids)), "(UID BODYSTRUCTURE)")
+    if status != "OK":
+        print(f"Erro ao ler a estrutura dos UIDs {uids[0]}-{uids[-1]}: {dados}")
+        return {}
+    respostas = []
+    for parte in dados:
+        if isinstance(parte, tuple):
+            # Valor enviado como literal ({n}): volta a ser uma string entre aspas
+            literal = parte[1].decode(errors="replace").replace("\\", "\\\\").replace('"', '\\"')
+            trecho = re.sub(r"\{\d+\}$", "", parte[0].decode(errors="replace")) + f'"{literal}"'
+        else:
+            trecho = parte.decode(errors="replace")
+        if re.match(r"\d+ \(", trecho):
+            respostas.append(trecho)
+        elif respostas:
+            respostas[-1] += trecho
+    estruturas = {}
+    for resposta in respostas:
+        uid, inicio = re.search(r"UID (\d+)", resposta), resposta.find("BODYSTRUCTURE ")
+        if uid and inicio >= 0:
+            try:
+                estruturas[int(uid.group(1))] = _ler_lista(resposta[inicio + len("BODYSTRUCTURE "):])
+            except (ValueError, IndexError):
+                pass  # Estrutura não reconhecida: a mensagem é baixada inteira
+    return estruturas
+
+def _buscar_secoes(mail, uids, itens):
+    """
+    Executa UID FETCH e retorna {uid: {seção: bytes}} com os literais de cada mensagem.
+    """
+    status, dados = mail.uid("FETCH", ",".join(map(str, uids)), itens)
+    if status != "OK":
+        print(f"Erro ao baixar os UIDs {uids[0]}-{uids[-1]}: {dados}")
+        return {}
+    mensagens = []  # [uid, {seção: bytes}] na ordem da resposta
+    for parte in dados:
+        cabeca = parte[0] if isinstance(parte, tuple) else parte
+        if re.match(rb"\d+ \(", cabeca):
+            mensagens.append([None, {}])
+        if not mensagens:
+            continue
+        uid = re.search(rb"UID (\d+)", cabeca)
+        if uid:
+            mensagens[-1][0] = int(uid.group(1))
+        secao = re.findall(rb"BODY\[([^\]]*)\]", cabeca)
+        if isinstance(parte, tuple) and secao:
+            mensagens[-1][1][secao[-1].decode().upper()] = parte[1]
+    return {uid: secoes for uid, secoes in mensagens if uid is not None}
+
+def montar_mensagem(cabecalho, corpo, codificacao, charset):
+    """
+    Remonta uma mensagem só com o cabeçalho e a parte de texto, no formato que extrair_conteudo_email espera.
+    """
+    tipo = f'Content-Type: text/plain; charset="{charset}"\r\nContent-Transfer-Encoding: {codificacao}\r\n'
+    return email.message_from_bytes(cabecalho.rstrip(b"\r\n") + b"\r\n" + tipo.encode() + b"\r\n" + corpo)
+
+def buscar_emails_em_lote(mail, uids, tamanho=TAMANHO_BLOCO):
+    """
+    Baixa as mensagens em blocos de `tamanho` UIDs, na mesma sessão. Lê primeiro o BODYSTRUCTURE
+    e baixa só o remetente, o assunto e a parte de texto, sem os anexos (PDFs, planilhas);
+    mensagens sem parte text/plain reconhecível são baixadas inteiras.
+    Usa BODY.PEEK para não marcar como lida uma mensagem que ainda não foi respondida.
+    Gera pares (uid, mensagem) na ordem dos UIDs.
+    """
+    for inicio in range(0, len(uids), tamanho):
+        bloco = uids[inicio:inicio + tamanho]
+        partes = {uid: localizar_parte_texto(estrutura) for uid, estrutura in buscar_estruturas(mail, bloco).items()}
+        grupos = {}  # Uma busca por seção: mensagens com a mesma estrutura vêm no mesmo FETCH
+        for uid in bloco:
+            grupos.setdefault(partes[uid][0] if partes.get(uid) else None, []).append(uid)
+        mensagens = {}
+        for secao, uids_grupo in grupos.items():
+            if secao is None:
+                for uid, secoes in _buscar_secoes(mail, uids_grupo, "(UID BODY.PEEK[])").items():
+                    if "" in secoes:
+                        mensagens[uid] = email.message_from_bytes(secoes[""])
+                continue
+            itens = f"(UID BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)] BODY.PEEK[{secao}])"
+            for uid, secoes in _buscar_secoes(mail, uids_grupo, itens).items():
+                cabecalho = next((v for k, v in secoes.items() if k.startswith("HEADER")), b"")
+                _, codificacao, charset = partes[uid]
+                mensagens[uid] = montar_mensagem(cabecalho, secoes.get(secao, b""), codificacao, charset)
+        for uid in bloco:
+            if uid in mensagens:
+                yield uid, mensagens[uid]
+
+def processar_novos_emails(mail, uidvalidity, smtp=None, responder_antigos=False):
+    """
+    Responde aos e-mails não lidos que chegaram depois do último UID salvo, na sessão IMAP recebida.
+    As respostas são geradas em paralelo (até RESPOSTAS_CONCORRENTES, sob o limite por minuto)
+    enquanto os próximos e-mails são baixados; envio e marcação como lido seguem a ordem dos UIDs.
+    O último UID só avança enquanto as respostas dão certo: uma mensagem que falhou continua
+    não lida e volta a ser tentada na próxima verificação, até MAX_TENTATIVAS vezes (contadas no
+    arquivo de estado). Depois disso ela é marcada com estrela e ignorada, para não gastar novas
+    chamadas ao modelo nem travar o último UID. Retorna (respondidos, falhas).
+    Sem estado salvo (primeira execução ou caixa recriada), parte do último UID da caixa, para não
+    responder a todos os não lidos antigos; com responder_antigos=True eles também são respondidos.
+    """
+    estado = carregar_estado()
+    if estado.get("uidvalidity") != uidvalidity:
+        # Primeira execução ou caixa recriada no servidor: os UIDs salvos não valem mais
+        estado = {"uidvalidity": uidvalidity, "ultimo_uid": 0 if responder_antigos else ultimo_uid_da_caixa(mail)}
+        salvar_estado(estado)
+    tentativas = estado.setdefault("tentativas", {})  # UID -> respostas que já falharam
+    encontrados = buscar_uids_novos(mail, estado["ultimo_uid"])
+    uids = [uid for uid in encontrados if tentativas.get(str(uid), 0) < MAX_TENTATIVAS]
+    print(f"{len(uids)} e-mail(s) novo(s) para responder.")
+    respondidos, falhas = 0, 0
+    bloqueado = False  # Uma falha que ainda será tentada de novo segura o último UID
+    pendentes = deque()
+
+    def concluir():
+        nonlocal respondidos, falhas, bloqueado
+        uid, remetente, subject, futuro = pendentes.popleft()
+        try:
+            enviar_email(remetente, "Re: " + (subject or ""), futuro.result(), smtp)
+            marcar_email_como_lido(mail, str(uid), uid=True)
+            print("Resposta enviada para:", remetente)
+            respondidos += 1
+            tentativas.pop(str(uid), None)
+        except Exception as e:
+            print(f"Erro ao responder o e-mail UID {uid}: {e}")
+            falhas += 1
+            tentativas[str(uid)] = tentativas.get(str(uid), 0) + 1
+            if tentativas[str(uid)] < MAX_TENTATIVAS:
+                bloqueado = True
+            else:
+                print(f"E-mail UID {uid} falhou {tentativas[str(uid)]} vezes e não será mais tentado (marcado com estrela).")
+                try:
+                    marcar_email_com_estrela(mail, str(uid))
+                except imaplib.IMAP4.error as erro:
+                    print(f"Não foi possível marcar o e-mail UID {uid}: {erro}")
+        if not bloqueado:
+            estado["ultimo_uid"] = uid
+        salvar_estado(estado)
+
+    with ThreadPoolExecutor(max_workers=RESPOSTAS_CONCORRENTES, thread_name_prefix="resposta") as executor:
+        for uid, msg in buscar_emails_em_lote(mail, uids):
+            remetente, subject, body = extrair_conteudo_email(msg)
+            print("Email recebido de:", remetente)
+            print("Assunto:", subject)
+            pendentes.append((uid, remetente, subject, executor.submit(gerar_resposta_limitada, body)))
+            if len(pendentes) >= 2 * RESPOSTAS_CONCORRENTES:  # Não baixa muito à frente das respostas
+                concluir()
+        while pendentes:
+            concluir()
+    if not bloqueado and encontrados and encontrados[-1] > estado["ultimo_uid"]:
+        estado["ultimo_uid"] = encontrados[-1]  # Só sobraram mensagens já abandonadas
+        salvar_estado(estado)
+    return respondidos, falhas
+
+def responder_novos_emails(responder_antigos=False):
+    """
+    Responde a todos os e-mails não lidos que chegaram desde a última execução,
+    em uma única sessão IMAP e uma única sessão SMTP. Retorna (respondidos, falhas).
+    """
+    mail, uidvalidity = conectar_imap()
+    smtp = SessaoSMTP()
+    try:
+        return processar_novos_emails(mail, uidvalidity, smtp, responder_antigos)
+    finally:
+        smtp.fechar()
+        mail.logout()
+
+# ------------------------ MODO DAEMON ------------------------
+def _ha_dados_para_ler(mail):
+    """
+    Indica, sem bloquear, se já há resposta do servidor para ler: linhas que o imaplib guardou
+    no buffer junto com a anterior ou dados que chegaram no socket (inclusive já decifrados pelo SSL).
+    """
+    timeout = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+def aguardar_novos_emails(mail, parar, timeout=IDLE_TIMEOUT):
+    """
+    Mantém a sessão em IDLE até o servidor avisar que chegou mensagem (EXISTS), até `timeout`
+    segundos ou até `parar` ser sinalizado. Retorna True se chegou mensagem.
+    O imaplib só ganhou suporte a IDLE no Python 3.14, por isso o comando é enviado diretamente.
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b" IDLE\r\n")
+    resposta = mail.readline()
+    if not resposta.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE recusado: {resposta!r}")
+    chegou, limite = False, time.monotonic() + timeout
+    try:
+        while not chegou and not parar.is_set() and time.monotonic() < limite:
+            # Linhas já no buffer do imaplib (chegam junto com o "+") não aparecem no select
+            if not _ha_dados_para_ler(mail) and not select.select([mail.sock], [], [], 1.0)[0]:
+                continue
+            linha = mail.readline()
+            if not linha:
+                raise imaplib.IMAP4.abort("conexão encerrada pelo servidor durante o IDLE")
+            chegou = b"EXISTS" in linha
+    finally:
+        mail.send(b"DONE\r\n")
+        while True:
+            linha = mail.readline()
+            if not linha:
+                raise imaplib.IMAP4.abort("conexão encerrada pelo servidor ao sair do IDLE")
+            if linha.startswith(tag):
+                break
+    return chegou
+
+class StatusDaemon:
+    """
+    Situação do daemon gravada em STATUS_FILE a cada evento, para monitoramento
+    (python reduzir.py --modo status).
+    """
+
+    def __init__(self):
+        self.dados = {
+            "pid": os.getpid(), "situacao": "iniciando", "iniciado_em": time.time(),
+            "ultima_atividade": time.time(), "ultima_resposta": None, "respondidos": 0,
+            "falhas": 0, "reconexoes_imap": 0, "reconexoes_smtp": 0, "erros_inesperados": 0, "ultimo_erro": None,
+        }
+
+    def atualizar(self, **campos):
+        self.dados.update(campos, ultima_atividade=time.time())
+        try:
+            gravar_json(STATUS_FILE, self.dados)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Erro ao gravar o status: {e}")
+
+def executar_daemon(parar=None, responder_antigos=False):
+    """
+    Fica conectado em IDLE e responde aos e-mails assim que chegam, reaproveitando a mesma
+    sessão SMTP. Reconecta com espera crescente se a sessão IMAP cair e encerra de forma
+    limpa quando `parar` é sinalizado (SIGTERM/SIGINT em main).
+    """
+    parar = parar or threading.Event()
+    status = StatusDaemon()
+    smtp = SessaoSMTP()
+    espera = 1
+    try:
+        while not parar.is_set():
+            mail = None
+            try:
+                mail, uidvalidity = conectar_imap()
+                status.atualizar(situacao="conectado", reconexoes_smtp=smtp.reconexoes)
+                espera = 1
+                while not parar.is_set():
+                    # Avisos de mensagem nova já recebidos são cobertos pela busca logo abaixo
+                    mail.untagged_responses.pop("EXISTS", None)
+                    respondidos, falhas = processar_novos_emails(mail, uidvalidity, smtp, responder_antigos)
+                    if respondidos:
+                        status.dados["ultima_resposta"] = time.time()
+                    status.atualizar(
+                        situacao="aguardando",
+                        respondidos=status.dados["respondidos"] + respondidos,
+                        falhas=status.dados["falhas"] + falhas,
+                        reconexoes_smtp=smtp.reconexoes,
+                    )
+                    # Um EXISTS que chegou durante o FETCH/STORE fica guardado pelo imaplib e não
+                    # aparece no IDLE: nesse caso verifica de novo sem esperar
+                    if mail.untagged_responses.get("EXISTS"):
+                        continue
+                    # Mesmo sem mensagem nova (IDLE renovado), verifica de novo: as respostas
+                    # que falharam são tentadas outra vez e o status ganha um sinal de vida
+                    aguardar_novos_emails(mail, parar)
+            except (imaplib.IMAP4.error, imaplib.IMAP4.abort, OSError) as e:
+                print(f"Conexão IMAP perdida ({e}); nova tentativa em {espera}s.")
+                status.atualizar(
+                    situacao="reconectando", ultimo_erro=f"{type(e).__name__}: {e}"[:300],
+                    reconexoes_imap=status.dados["reconexoes_imap"] + 1,
+                )
+                parar.wait(espera)
+                espera = min(espera * 2, 60)
+            except Exception as e:
+                # Erro inesperado (estado, status, resposta estranha no IDLE): o daemon não para por ele
+                print(f"Erro inesperado no daemon ({type(e).__name__}: {e}); nova tentativa em {espera}s.")
+                traceback.print_exc()
+                status.atualizar(
+                    situacao="reconectando", ultimo_erro=f"{type(e).__name__}: {e}"[:300],
+                    erros_inesperados=status.dados["erros_inesperados"] + 1,
+                )
+                parar.wait(espera)
+                espera = min(espera * 2, 60)
+            finally:
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+    finally:
+        smtp.fechar()
+        status.atualizar(situacao="parado")
+
+def verificar_status():
+    """
+    Imprime o status do daemon e retorna 0 se ele está ativo e deu sinal de vida recentemente.
+    """
+    try:
+        with open(STATUS_FILE, encoding="utf-8") as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        print(f"Nenhum status em {STATUS_FILE}.")
+        return 1
+    print(json.dumps(dados, ensure_ascii=False, indent=2))
+    recente = time.time() - dados.get("ultima_atividade", 0) < 2 * IDLE_TIMEOUT + 60
+    return 0 if recente and dados.get("situacao") in ("conectado", "aguardando") else 1
+
+def responder_ultimo_email():
     # Buscar o último e-mail recebido
     msg, email_id, mail = buscar_ultimo_email()
     if msg:
@@ -119,5 +671,37 @@ def main():
     else:
         print("Nenhum e-mail encontrado.")
 
+def main():
+    parser = argparse.ArgumentParser(description="Responde automaticamente os e-mails da caixa de entrada.")
+    parser.add_argument(
+        "--modo", choices=("lote", "ultimo", "daemon", "status"), default="lote",
+        help=(
+            "lote: todos os não lidos desde a última execução; ultimo: somente o e-mail mais recente; "
+            "daemon: fica conectado e responde assim que o e-mail chega; status: situação do daemon."
+        ),
+    )
+    parser.add_argument(
+        "--responder-antigos", action="store_true",
+        help=(
+            "sem estado salvo (primeira execução), responde também aos não lidos que já estavam na caixa; "
+            "por padrão, só os e-mails que chegarem depois da primeira execução são respondidos."
+        ),
+    )
+    args = parser.parse_args()
+
+    if args.modo == "status":
+        sys.exit(verificar_status())
+    if args.modo == "daemon":
+        parar = threading.Event()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sinal, lambda *_: parar.set())
+        executar_daemon(parar, args.responder_antigos)
+        return
+    if args.modo == "ultimo":
+        responder_ultimo_email()
+        return
+    respondidos, falhas = responder_novos_emails(args.responder_antigos)
+    print(f"{respondidos} resposta(s) enviada(s), {falhas} falha(s).")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+import agente
+
+TIMEOUT = 10  # Segundos; acima disso identify_items travou
+
+
+def run_with_timeout(function):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["resultado"] = function()
+        except Exception as error:
+            outcome["erro"] = error
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "identify_items travou"
+    return outcome
+
+
+@pytest.fixture
+def streaming_lookup(monkeypatch):
+    """Substitui lookup_product por streams locais; o código "erro" faz a busca falhar."""
+    opened, closed = [], []
+
+    def fake_lookup(code, context, validate=True, stream=False):
+        if code == "erro":
+            raise RuntimeError("falha na busca")
+
+        def chunks():
+            opened.append(code)
+            try:
+                yield f"produto {code}"
+                yield " fim"
+            finally:
+                closed.append(code)
+
+        return chunks()
+
+    monkeypatch.setattr(agente, "lookup_product", fake_lookup)
+    return opened, closed
+
+
+def candidates(codes):
+    return [(code, f"contexto {code}", True) for code in codes]
+
+
+def test_stream_lookup_error_does_not_hang(streaming_lookup):
+    opened, closed = streaming_lookup
+    codes = ["erro"] + [f"{n:06d}" for n in range(6)]
+
+    def consume():
+        return [
+            "".join(product)
+            for _, _, product in agente.identify_items(candidates(codes), concurrency=2, stream=True)
+        ]
+
+    outcome = run_with_timeout(consume)
+    assert isinstance(outcome.get("erro"), RuntimeError)
+    assert sorted(opened) == sorted(closed)
+
+
+def test_stream_abandoned_by_consumer_does_not_hang(streaming_lookup):
+    opened, closed = streaming_lookup
+    codes = [f"{n:06d}" for n in range(7)]
+
+    def consume():
+        items = agente.identify_items(candidates(codes), concurrency=2, stream=True)
+        next(items)
+        items.close()
+
+    outcome = run_with_timeout(consume)
+    assert "erro" not in outcome
+    assert sorted(opened) == sorted(closed)
+
+
+def test_stream_reads_every_item(streaming_lookup):
+    codes = [f"{n:06d}" for n in range(7)]
+
+    def consume():
+        return {
+            code: "".join(product)
+            for code, _, product in agente.identify_items(candidates(codes), concurrency=2, stream=True)
+        }
+
+    outcome = run_with_timeout(consume)
+    assert outcome["resultado"] == {code: f"produto {code} fim" for code in codes}